@@ -1,9 +1,16 @@
 import os
 import re
+import sys
+import ast
+import gzip
 import json
+import time
+import shutil
+import hashlib
 import tarfile
-import distutils
-from distutils import dir_util
+import tempfile
+import subprocess
+import multiprocessing
 import py_compile
 import click
 
@@ -16,11 +23,18 @@ try:
 except ImportError:
     colorama = None
 
+try:
+    import requests
+except ImportError:
+    requests = None
+
 try:
     from termcolor import colored
 except ImportError:
     colored = None
 
+from dabcat_common import literal_pattern, index_params, fetch_container_artifacts
+
 IMPORTANT_FILES = {
     'connector_file': None,
     'connector_data': None,
@@ -28,13 +42,43 @@ IMPORTANT_FILES = {
     'metadata_data': None,
     'replacerizer_file': None,
     'replacerizer_data': None,
+    'replacerizer': None,
+    'runtime_data': None,
+    'common_data': None,
+    'snapshot_data': None,
     'dummy_data': []
 }
 
+RUNTIME_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dabcat_runtime.py')
+COMMON_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dabcat_common.py')
+
 IMPORTANT_SETTINGS = {
-    'fail_on_data_not_found': None
+    'fail_on_data_not_found': None,
+    'cache_ttl': 300,
+    'retries': 3,
+    'connect_timeout': 5,
+    'read_timeout': 60,
+    'vault_cache_mb': 64,
+    'vault_cache_persist': False,
+    'stream_threshold_mb': 16,
+    'metrics': False,
+    'poll_workers': 4,
+    'poll_save_rate': 0,
+    'render_cache_mb': 256,
+    'param_workers': 0,
+    'snapshot': False,
+    'phantom_url': None,
+    'import_report': False,
+    'compresslevel': 6,
+    'pigz': False
 }
 
+# the settings handed to dabcat_runtime in the generated connector, the rest only matter while building
+RUNTIME_SETTINGS = [
+    'fail_on_data_not_found', 'cache_ttl', 'retries', 'connect_timeout', 'read_timeout', 'vault_cache_mb', 'vault_cache_persist', 'stream_threshold_mb', 'metrics',
+    'poll_workers', 'poll_save_rate', 'render_cache_mb', 'param_workers'
+]
+
 PREAMBLE = '' \
         '{tab}{tab}#####################################\n' \
         '{tab}{tab}#### start DABCAT generated code ####\n' \
@@ -102,24 +146,105 @@ def cat_banner():
 ''', "green")
 
 
-def check_folder(directory='.', file_to_find=None, file_key=None):
+# directories that never hold the connector, metadata or replacerizer but can hold tens of thousands of files
+DISCOVERY_PRUNED_DIRS = set(['.git', '.hg', '.svn', '.tox', '.venv', 'venv', 'wheels', 'node_modules', '__pycache__', 'dist', 'build'])
+
+
+def is_metadata_file(file_path):
+    try:
+        with open(file_path, 'r') as opened_file:
+            file_data = json.load(opened_file)
+    except (IOError, OSError, ValueError):
+        return False
+
+    return isinstance(file_data, dict) and 'appid' in file_data and 'actions' in file_data
+
+
+def discovery_cache_file(directory):
+    directory = os.path.abspath(directory)
+    return os.path.join(os.path.dirname(directory), '.{}.dabcat_discovery.json'.format(os.path.basename(directory)))
+
+
+def file_signature(file_path):
+    file_stat = os.stat(file_path)
+    return [file_stat.st_size, file_stat.st_mtime]
+
+
+def read_discovery_cache(directory):
+    # a cached discovery is good as long as every directory it walked still has the same mtime and every file it found still exists.
+    # the metadata file was picked for what's in it, which directory mtimes don't cover, so it also has to be unchanged itself
+    try:
+        with open(discovery_cache_file(directory), 'r') as cache_file:
+            discovery = json.load(cache_file)
+        for walked_dir, walked_mtime in discovery['dirs'].items():
+            if os.path.getmtime(os.path.join(directory, walked_dir)) != walked_mtime:
+                return None
+        if discovery['found']['metadata_file'] and file_signature(os.path.join(directory, discovery['found']['metadata_file'])) != discovery['metadata']:
+            return None
+    except (IOError, OSError, ValueError, KeyError):
+        return None
+
+    if not all(os.path.exists(os.path.join(directory, file_path)) for file_path in discovery['found'].values() if file_path):
+        return None
+
+    return discovery['found']
+
+
+def write_discovery_cache(directory, found, walked_dirs):
+    cache_file = discovery_cache_file(directory)
+    try:
+        metadata = file_signature(os.path.join(directory, found['metadata_file'])) if found['metadata_file'] else None
+        cache_fd, cache_tmp_file = tempfile.mkstemp(dir=os.path.dirname(cache_file))
+        with os.fdopen(cache_fd, 'w') as opened_cache:
+            json.dump({'found': found, 'dirs': walked_dirs, 'metadata': metadata}, opened_cache)
+        os.rename(cache_tmp_file, cache_file)
+    except (IOError, OSError):
+        pass
+
+
+def discover_files(directory='.'):
+    found = read_discovery_cache(directory)
+    if found is not None:
+        return dict((file_key, os.path.join(directory, file_path) if file_path else None) for file_key, file_path in found.items())
+
+    found = {'connector_file': None, 'metadata_file': None, 'replacerizer_file': None}
+    walked_dirs = {}
     for root, dirs, files in os.walk(directory):
+        dirs[:] = [dir_name for dir_name in dirs if dir_name not in DISCOVERY_PRUNED_DIRS]
+        walked_dirs[os.path.relpath(root, directory)] = os.path.getmtime(root)
         for file_name in files:
-            if file_to_find:
+            file_path = os.path.join(root, file_name)
+            if file_name.lower().endswith('_connector.py'):
+                found['connector_file'] = found['connector_file'] or file_path
+            elif 'replacerizer' in file_name.lower():
+                found['replacerizer_file'] = found['replacerizer_file'] or file_path
+            elif file_name.lower().endswith('.json') and not found['metadata_file'] and is_metadata_file(file_path):
+                found['metadata_file'] = file_path
+
+        if found['connector_file'] and found['metadata_file'] and found['replacerizer_file']:
+            break
+
+    write_discovery_cache(
+        directory,
+        dict((file_key, os.path.relpath(file_path, directory) if file_path else None) for file_key, file_path in found.items()),
+        walked_dirs
+    )
+
+    return found
+
+
+def check_folder(directory='.', file_to_find=None, file_key=None):
+    if file_to_find:
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = [dir_name for dir_name in dirs if dir_name not in DISCOVERY_PRUNED_DIRS]
+            for file_name in files:
                 if file_to_find.lower() == file_name.lower():
-                    IMPORTANT_FILES[file_key] = '{}/{}'.format(directory, file_name)
+                    IMPORTANT_FILES[file_key] = os.path.join(root, file_name)
                     return True
-            else:
-                if file_name.lower().endswith('_connector.py'):
-                    IMPORTANT_FILES['connector_file'] = '{}/{}'.format(directory, file_name)
-                elif 'replacerizer' in file_name.lower():
-                    IMPORTANT_FILES['replacerizer_file'] = '{}/{}'.format(directory, file_name)
-                elif '.json' in file_name.lower():
-                    IMPORTANT_FILES['metadata_file'] = '{}/{}'.format(directory, file_name)
-                
-                if IMPORTANT_FILES['connector_file'] and IMPORTANT_FILES['metadata_file'] and IMPORTANT_FILES['replacerizer_file']:
-                    return True
-    
+        return False
+
+    IMPORTANT_FILES.update(discover_files(directory))
+
     if IMPORTANT_FILES['connector_file'] or IMPORTANT_FILES['metadata_file'] or IMPORTANT_FILES['replacerizer_file']:
         return True
 
@@ -155,6 +280,7 @@ def read_important_files():
                 file_data = json.loads(file_data)
             
             IMPORTANT_FILES[file_key.replace('_file', '_data')] = file_data
+    IMPORTANT_FILES['replacerizer'] = None
 
     return True
 
@@ -165,44 +291,16 @@ def process_data():
     tab = ' ' * (len(handle_action_match.groups()[0]) - len(handle_action_match.groups()[0].lstrip()))
 
     additional_imports = ''
-    if 'import re\n' not in IMPORTANT_FILES['connector_data'].lower():
-        additional_imports += 'import re\n'
-    if 'import json' not in IMPORTANT_FILES['connector_data'].lower():
-        additional_imports += 'import json\n'
-    if 'from phantom.vault import Vault' not in IMPORTANT_FILES['connector_data'].lower():
-        additional_imports += 'from phantom.vault import Vault\n'
-    if 'import uuid' not in IMPORTANT_FILES['connector_data'].lower():
-        additional_imports += 'import uuid\n'
-    if 'import tarfile' not in IMPORTANT_FILES['connector_data'].lower():
-        additional_imports += 'import tarfile\n'
-    if 'import os' not in IMPORTANT_FILES['connector_data'].lower():
-        additional_imports += 'import os\n'
-    if 'from phantom.action_result import ActionResult'.lower() not in IMPORTANT_FILES['connector_data'].lower():
-        additional_imports += 'from phantom.action_result import ActionResult\n'
-    if 'import requests' not in IMPORTANT_FILES['connector_data'].lower():
-        additional_imports += 'import requests\n'
-    if 'import phantom.rules as ph_rules' not in IMPORTANT_FILES['connector_data'].lower():
-        additional_imports += 'import phantom.rules as ph_rules\n'
+    if 'import dabcat_runtime' not in IMPORTANT_FILES['connector_data'].lower():
+        additional_imports += 'import dabcat_runtime\n'
+    additional_imports += 'DABCAT_SETTINGS = {}\n'.format(
+        repr(dict((setting_key, IMPORTANT_SETTINGS[setting_key]) for setting_key in RUNTIME_SETTINGS))
+    )
 
+    # the runtime itself ships as dabcat_runtime.py next to the connector, so only thin calls into it are injected
     check_if_data_match_code = \
-        '{tab}{tab}def _dabcat_get_data(endpoint, params=None):\n' \
-        '{tab}{tab}{tab}dabcat_base_url = self._get_phantom_base_url()\n' \
-        '{tab}{tab}{tab}headers = {{\'ph-auth-token\': os.environ[\'PHANTOM_API_KEY\']}}\n' \
-        '{tab}{tab}{tab}try:\n' \
-        '{tab}{tab}{tab}{tab}r = requests.get(\'{{0}}rest/{{1}}\'.format(dabcat_base_url, endpoint), params=params, headers=headers, verify=False)\n' \
-        '{tab}{tab}{tab}except Exception as e:\n' \
-        '{tab}{tab}{tab}{tab}message = (\'Action run failed. Exception: {{0}}\').format(e.message)\n' \
-        '{tab}{tab}{tab}{tab}return False, message\n' \
-        '{tab}{tab}{tab}if r is None:\n' \
-        '{tab}{tab}{tab}{tab}return False, \'Unable to retrieve configuration data\'\n' \
-        '{tab}{tab}{tab}return True, r.json()\n\n' \
-        '{tab}{tab}dabcat_app_json = self.get_app_json()\n' \
-        '{tab}{tab}dabcat_app_product = dabcat_app_json[\'product_name\']\n' \
-        '{tab}{tab}action = self.get_action_identifier()\n' \
-        '{tab}{tab}params = {{\'page_size\': 0, \'_filter_label\': \'"demo_configuration"\', \'_filter_name\': \'"{{0}}"\'.format(dabcat_app_product), \'_filter_description\': \'"{{0}}"\'.format(action)}}\n' \
-        '{tab}{tab}success, demo_config_container = _dabcat_get_data(\'container\', params=params)\n' \
-        '{tab}{tab}if (success and demo_config_container[\'count\'] > 0) or ({fail_option} == True):\n' \
-        '{tab}{tab}{tab}return True\n'.format(tab=tab, fail_option=IMPORTANT_SETTINGS['fail_on_data_not_found'])
+        '{tab}{tab}if dabcat_runtime.check_if_data_match(self, DABCAT_SETTINGS):\n' \
+        '{tab}{tab}{tab}return True\n'.format(tab=tab)
 
     IMPORTANT_FILES['connector_data'] = fix_ize(IMPORTANT_FILES['connector_data'], r'([ ]+def initialize\([^)]+\)\:\n)', check_if_data_match_code)
     IMPORTANT_FILES['connector_data'] = fix_ize(IMPORTANT_FILES['connector_data'], r'([ ]+def finalize\([^)]+\)\:\n)', check_if_data_match_code)
@@ -216,218 +314,9 @@ def process_data():
         + '{tab}{tab}action = self.get_action_identifier()\n'.format(tab=tab)
 
     core_capability = \
-        '{tab}{tab}dabcat_app_json = self.get_app_json()\n' \
-        '{tab}{tab}dabcat_app_product = dabcat_app_json[\'product_name\']\n' \
-        '{tab}{tab}dabcat_appid = dabcat_app_json[\'appid\']\n' \
-        '{tab}{tab}def _dabcat_strip_artifact_identifiers(artifact_data):\n' \
-        '{tab}{tab}{tab}artifact_data.pop(\'container_id\', None)\n' \
-        '{tab}{tab}{tab}artifact_data.pop(\'container\', None)\n' \
-        '{tab}{tab}{tab}artifact_data.pop(\'create_time\', None)\n' \
-        '{tab}{tab}{tab}artifact_data.pop(\'start_time\', None)\n' \
-        '{tab}{tab}{tab}artifact_data.pop(\'update_time\', None)\n' \
-        '{tab}{tab}{tab}artifact_data.pop(\'id\', None)\n' \
-        '{tab}{tab}{tab}artifact_data.pop(\'owner_id\', None)\n' \
-        '{tab}{tab}{tab}artifact_data[\'ingest_app_id\'] = dabcat_appid\n' \
-        '{tab}{tab}{tab}return artifact_data\n\n' \
-        '{tab}{tab}def _dabcat_get_phantom_base_url(self):\n' \
-        '{tab}{tab}{tab}base_url = self._get_phantom_base_url()\n' \
-        '{tab}{tab}{tab}if "PHANTOM_BASE_URL" in os.environ:\n' \
-        '{tab}{tab}{tab}{tab}base_url = os.environ["PHANTOM_BASE_URL"]\n' \
-        '{tab}{tab}{tab}return base_url\n' \
-        '{tab}{tab}def _dabcat_get_poll_vault_data(poll_vault_id, label):\n' \
-        '{tab}{tab}{tab}poll_vault_id = poll_vault_id.strip()\n' \
-        '{tab}{tab}{tab}_, _, poll_vault_path = ph_rules.vault_info(poll_vault_id.strip())\n' \
-        '{tab}{tab}{tab}poll_vault_path = list(poll_vault_path)[0][\'path\']\n' \
-        '{tab}{tab}{tab}_, _, poll_vault_info = ph_rules.vault_info(vault_id=poll_vault_id.strip())\n' \
-        '{tab}{tab}{tab}poll_vault_tmp_path = \'{{0}}/{{1}}\'.format(Vault.get_vault_tmp_dir(), poll_vault_info[0][\'name\'].replace(\'.tgz\',\'\'))\n' \
-        '{tab}{tab}{tab}poll_vault_container_json = None\n' \
-        '{tab}{tab}{tab}poll_vault_container_files = []\n' \
-        '{tab}{tab}{tab}try:\n' \
-        '{tab}{tab}{tab}{tab}with tarfile.open(poll_vault_path, \'r:gz\') as container_tar:\n' \
-        '{tab}{tab}{tab}{tab}{tab}members = container_tar.getmembers()\n' \
-        '{tab}{tab}{tab}{tab}{tab}for member in members:\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}member_file = container_tar.extractfile(member)\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}if not os.path.exists(poll_vault_tmp_path):\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}{tab}os.makedirs(poll_vault_tmp_path)\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}with open(\'{{0}}/{{1}}\'.format(poll_vault_tmp_path, os.path.basename(member_file.name)), \'w\') as container_file:\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}{tab}file_data = member_file.read()\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}{tab}container_file.write(file_data)\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}{tab}if os.path.basename(member_file.name).lower() == \'container.json\':\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}{tab}{tab}poll_vault_container_json = file_data\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}{tab}else:\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}{tab}{tab}poll_vault_container_files.append(os.path.basename(member_file.name))\n' \
-        '{tab}{tab}{tab}except Exception as err:\n' \
-        '{tab}{tab}{tab}{tab}_dabcat_early_failure(\'Unable to read poll data. Details - {{0}}\'.format(str(err)))\n' \
-        '{tab}{tab}{tab}{tab}return False\n' \
-        '{tab}{tab}{tab}poll_vault_container_data = json.loads(poll_vault_container_json)\n' \
-        '{tab}{tab}{tab}for artifact in poll_vault_container_data[\'artifacts\']:\n' \
-        '{tab}{tab}{tab}{tab}artifact = _dabcat_strip_artifact_identifiers(artifact)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'].pop(\'create_time\', None)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'].pop(\'asset_id\', None)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'].pop(\'due_time\', None)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'].pop(\'id\', None)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'].pop(\'hash\', None)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'].pop(\'start_time\', None)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'].pop(\'artifact_update_time\', None)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'].pop(\'container_update_time\', None)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'].pop(\'owner_id\', None)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'].pop(\'label\', None)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'].pop(\'current_phase_id\', None)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'].pop(\'close_time\', None)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'].pop(\'open_time\', None)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'].pop(\'closing_owner_id\', None)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'].pop(\'role_id\', None)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'].pop(\'node_guid\', None)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'].pop(\'in_case\', None)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'].pop(\'owner_name\', None)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'].pop(\'tenant_id\', None)\n' \
-        '{tab}{tab}{tab}poll_vault_container_data[\'container\'][\'source_data_identifier\'] = str(uuid.uuid4())\n' \
-        '{tab}{tab}{tab}container_details = poll_vault_container_data.pop(\'container\', None)\n' \
-        '{tab}{tab}{tab}container_details[\'artifacts\'] = poll_vault_container_data.pop(\'artifacts\', None)\n' \
-        '{tab}{tab}{tab}vault_documents = poll_vault_container_data.pop(\'vault_documents\', None)\n' \
-        '{tab}{tab}{tab}container_details[\'label\'] = label\n' \
-        '{tab}{tab}{tab}status, message, container_id = self.save_container(container_details)\n' \
-        '{tab}{tab}{tab}try:\n' \
-        '{tab}{tab}{tab}{tab}for poll_vault_container_file in poll_vault_container_files:\n' \
-        '{tab}{tab}{tab}{tab}{tab}file_name = [vault_doc for vault_doc in vault_documents if vault_doc[\'hash\'] == poll_vault_container_file]\n' \
-        '{tab}{tab}{tab}{tab}{tab}file_name = file_name[0][\'names\'][0] if file_name and file_name[0][\'names\'] else None\n' \
-        '{tab}{tab}{tab}{tab}{tab}Vault.add_attachment(\'{{0}}/{{1}}\'.format(poll_vault_tmp_path, poll_vault_container_file), container_id, file_name=file_name)\n' \
-        '{tab}{tab}{tab}except Exception as err:\n' \
-        '{tab}{tab}{tab}{tab}_dabcat_early_failure(\'Unable to write poll data. Details - {{0}}\'.format(str(err)))\n' \
-        '{tab}{tab}{tab}{tab}return False\n' \
-        '{tab}{tab}{tab}return True\n\n' \
-        '{tab}{tab}def _dabcat_add_other_artifacts(other_artifacts, replacerizer):\n' \
-        '{tab}{tab}{tab}for other_artifact in other_artifacts:\n' \
-        '{tab}{tab}{tab}{tab}if replacerizer:\n' \
-        '{tab}{tab}{tab}{tab}{tab}other_artifact = json.dumps(other_artifact)\n' \
-        '{tab}{tab}{tab}{tab}{tab}success, other_artifact = _dabcat_replacerize(other_artifact, replacerizer)\n' \
-        '{tab}{tab}{tab}{tab}{tab}if not(success):\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}return False\n' \
-        '{tab}{tab}{tab}{tab}{tab}other_artifact = json.loads(other_artifact)\n' \
-        '{tab}{tab}{tab}{tab}if other_artifact[\'cef\'].get(\'vaultId\'):\n' \
-        '{tab}{tab}{tab}{tab}{tab}_, _, vault_info = ph_rules.vault_info(other_artifact[\'cef\'][\'vaultId\'].strip())\n' \
-        '{tab}{tab}{tab}{tab}{tab}Vault.add_attachment(ph_rules.vault_info(other_artifact[\'cef\'][\'vaultId\'])[2][0][\'path\'], self.get_container_id(), file_name=vault_info[0][\'name\'])\n' \
-        '{tab}{tab}{tab}{tab}other_artifact = _dabcat_strip_artifact_identifiers(other_artifact)\n' \
-        '{tab}{tab}{tab}{tab}other_artifact[\'container_id\'] = self.get_container_id()\n' \
-        '{tab}{tab}{tab}{tab}status, message, artifact_id = self.save_artifact(other_artifact)\n' \
-        '{tab}{tab}{tab}{tab}if status == phantom.APP_ERROR:\n' \
-        '{tab}{tab}{tab}{tab}{tab}_dabcat_early_failure(\'Could not load artifact. Details - {{0}}\'.format(message))\n' \
-        '{tab}{tab}{tab}{tab}{tab}return False\n' \
-        '{tab}{tab}{tab}{tab}\n' \
-        '{tab}{tab}{tab}return True\n\n' \
-        '{tab}{tab}def _dabcat_get_data(endpoint, params=None):\n' \
-        '{tab}{tab}{tab}dabcat_base_url = self._dabcat_get_phantom_base_url()\n' \
-        '{tab}{tab}{tab}headers = {{\'ph-auth-token\': os.environ[\'PHANTOM_API_KEY\']}}\n' \
-        '{tab}{tab}{tab}try:\n' \
-        '{tab}{tab}{tab}{tab}r = requests.get(\'{{0}}rest/{{1}}\'.format(dabcat_base_url, endpoint), params=params, headers=headers, verify=False)\n' \
-        '{tab}{tab}{tab}except Exception as e:\n' \
-        '{tab}{tab}{tab}{tab}message = (\'Action run failed. Exception: {{0}}\').format(e.message)\n' \
-        '{tab}{tab}{tab}{tab}return False, message\n' \
-        '{tab}{tab}{tab}if r is None:\n' \
-        '{tab}{tab}{tab}{tab}return False, \'Unable to retrieve configuration data\'\n' \
-        '{tab}{tab}{tab}return True, r.json()\n\n' \
-        '{tab}{tab}def _dabcat_early_failure(message):\n' \
-        '{tab}{tab}{tab}action_result = self.add_action_result(ActionResult(dict(param)))\n' \
-        '{tab}{tab}{tab}action_result.set_status(phantom.APP_ERROR, message)\n' \
-        '{tab}{tab}{tab}return action_result.get_status()\n\n' \
-        '{tab}{tab}def _dabcat_get_vault_data(vault_id):\n' \
-        '{tab}{tab}{tab}vault_data = None\n' \
-        '{tab}{tab}{tab}try:\n' \
-        '{tab}{tab}{tab}{tab}_, _, vault_path = ph_rules.vault_info(vault_id.strip())\n' \
-        '{tab}{tab}{tab}{tab}vault_path = list(vault_path)[0][\'path\']\n' \
-        '{tab}{tab}{tab}{tab}with open(vault_path, \'r\') as vault_file:\n' \
-        '{tab}{tab}{tab}{tab}{tab}vault_data = vault_file.read()\n' \
-        '{tab}{tab}{tab}except Exception as err:\n' \
-        '{tab}{tab}{tab}{tab}_dabcat_early_failure(\'Could not retrieve data. Details - {{0}}\'.format(str(err)))\n' \
-        '{tab}{tab}{tab}{tab}return False, None\n' \
-        '{tab}{tab}{tab}return True, vault_data\n\n' \
-        '{tab}{tab}def _dabcat_replacerize(action_result_data, vault_id):\n' \
-        '{tab}{tab}{tab}success, replacerizer_json = _dabcat_get_vault_data(vault_id)\n' \
-        '{tab}{tab}{tab}if not(success):\n' \
-        '{tab}{tab}{tab}{tab}return False, None\n' \
-        '{tab}{tab}{tab}replacerizer_json = json.loads(replacerizer_json)\n' \
-        '{tab}{tab}{tab}for replace_value in replacerizer_json.keys():\n' \
-        '{tab}{tab}{tab}{tab}action_result_data = action_result_data.replace(replace_value, replacerizer_json[replace_value])\n' \
-        '{tab}{tab}{tab}replacerizer_wholesale = r\'(?:\\*\\*\\*)([^\\*]+)(?:\\*\\*\\*)\'\n' \
-        '{tab}{tab}{tab}action_result_data = re.sub(replacerizer_wholesale, lambda x: param.get(x.group().replace(\'*\',\'\')), action_result_data)\n' \
-        '{tab}{tab}{tab}return True, action_result_data\n\n' \
-        '{tab}{tab}params = {{\'page_size\': 0, \'_filter_label\': \'"demo_configuration"\', \'_filter_name\': \'"{{0}}"\'.format(dabcat_app_product), \'_filter_description\': \'"{{0}}"\'.format(action)}}\n' \
-        '{tab}{tab}success, demo_config_container = _dabcat_get_data(\'container\', params=params)\n' \
-        '{tab}{tab}if (not(success) or demo_config_container[\'count\'] == 0) and {fail_option} == True:\n' \
-        '{tab}{tab}{tab}return _dabcat_early_failure(\'There is no data for the action/parameter selected\')\n' \
-        '{tab}{tab}elif success:\n' \
-        '{tab}{tab}{tab}matching_artifact = None\n' \
-        '{tab}{tab}{tab}default_artifact = None\n' \
-        '{tab}{tab}{tab}other_artifacts = []\n' \
-        '{tab}{tab}{tab}poll_artifacts = []\n' \
-        '{tab}{tab}{tab}default_other_artifacts = []\n' \
-        '{tab}{tab}{tab}is_default = False\n' \
-        '{tab}{tab}{tab}for datum in demo_config_container[\'data\']:\n' \
-        '{tab}{tab}{tab}{tab}artifact_params = {{\'_filter_container_id\': datum[\'id\']}}\n' \
-        '{tab}{tab}{tab}{tab}artifact_success, demo_config_artifacts = _dabcat_get_data(\'artifact\', params=artifact_params)\n' \
-        '{tab}{tab}{tab}{tab}if not artifact_success:\n' \
-        '{tab}{tab}{tab}{tab}{tab}return _dabcat_early_failure(\'Unable to retrieve action data. Details: {{0}}\'.format(str(demo_config_artifact)))\n' \
-        '{tab}{tab}{tab}{tab}param_matches = [False]\n' \
-        '{tab}{tab}{tab}{tab}for artifact in demo_config_artifacts[\'data\']:\n' \
-        '{tab}{tab}{tab}{tab}{tab}if action == \'on_poll\' and artifact[\'name\'].lower().replace(\' \', \'_\') == \'poll_artifact\':\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}poll_artifacts.append(artifact)\n' \
-        '{tab}{tab}{tab}{tab}{tab}elif artifact[\'name\'].lower().replace(\' \',\'_\') == \'matching_criteria\':\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}if not(artifact[\'cef\'].get(\'dummy_default\')):\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}{tab}matching_artifact = artifact\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}else:\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}{tab}default_artifact = artifact\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}{tab}is_default = True\n' \
-        '{tab}{tab}{tab}{tab}{tab}else:\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}other_artifacts.append(artifact)\n' \
-        '{tab}{tab}{tab}{tab}if matching_artifact:\n' \
-        '{tab}{tab}{tab}{tab}{tab}param_matches = [str(param.get(cef_key)).lower() == str(matching_artifact[\'cef\'][cef_key]).lower() for cef_key in matching_artifact[\'cef\'].keys() if cef_key != \'replacerizer\' and cef_key != \'dummy_file_vault_id\']\n' \
-        '{tab}{tab}{tab}{tab}{tab}if all(param_matches):\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}break\n' \
-        '{tab}{tab}{tab}{tab}{tab}else:\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}matching_artifact = None\n' \
-        '{tab}{tab}{tab}{tab}if is_default:\n' \
-        '{tab}{tab}{tab}{tab}{tab}default_other_artifacts = other_artifacts\n' \
-        '{tab}{tab}{tab}{tab}is_default = False\n' \
-        '{tab}{tab}{tab}if action == \'on_poll\':\n' \
-        '{tab}{tab}{tab}{tab}if not(poll_artifacts) and {fail_option} == True:\n' \
-        '{tab}{tab}{tab}{tab}{tab}return _dabcat_early_failure(\'Theres is no data for polling action\')\n' \
-		'{tab}{tab}{tab}{tab}elif poll_artifacts:\n' \
-		'{tab}{tab}{tab}{tab}{tab}action_result = self.add_action_result(ActionResult(dict(param)))\n' \
-		'{tab}{tab}{tab}{tab}{tab}for poll_artifact in poll_artifacts:\n' \
-		'{tab}{tab}{tab}{tab}{tab}{tab}success = _dabcat_get_poll_vault_data(poll_artifact[\'cef\'][\'vaultId\'], poll_artifact[\'cef\'][\'label\'])\n' \
-		'{tab}{tab}{tab}{tab}{tab}{tab}if not(success):\n' \
-		'{tab}{tab}{tab}{tab}{tab}{tab}{tab}return action_result.get_status()\n' \
-		'{tab}{tab}{tab}{tab}{tab}return action_result.set_status(phantom.APP_SUCCESS, \'Poll successful\')\n' \
-        '{tab}{tab}{tab}else:\n' \
-        '{tab}{tab}{tab}{tab}data_artifact = matching_artifact if matching_artifact else default_artifact\n' \
-        '{tab}{tab}{tab}{tab}if not(data_artifact) and {fail_option} == True:\n' \
-        '{tab}{tab}{tab}{tab}{tab}return _dabcat_early_failure(\'There is no data for the action/parameter selected\')\n' \
-        '{tab}{tab}{tab}{tab}elif data_artifact:\n' \
-        '{tab}{tab}{tab}{tab}{tab}other_artifacts = other_artifacts if matching_artifact else default_other_artifacts\n' \
-        '{tab}{tab}{tab}{tab}{tab}action_result_data = None\n' \
-        '{tab}{tab}{tab}{tab}{tab}vault_success, action_result_data = _dabcat_get_vault_data(data_artifact[\'cef\'].get(\'dummy_file_vault_id\',\'\').strip())\n' \
-        '{tab}{tab}{tab}{tab}{tab}if not(vault_success):\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}return action_result.get_status()\n' \
-        '{tab}{tab}{tab}{tab}{tab}action_result = self.add_action_result(ActionResult(dict(param)))\n' \
-        '{tab}{tab}{tab}{tab}{tab}if data_artifact[\'cef\'].get(\'replacerizer\'):\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}success, action_result_data = _dabcat_replacerize(action_result_data, data_artifact[\'cef\'].get(\'replacerizer\'))\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}if not(success):\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}{tab}return action_result.get_status()\n' \
-        '{tab}{tab}{tab}{tab}{tab}try:\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}action_result_data = json.loads(action_result_data)\n' \
-        '{tab}{tab}{tab}{tab}{tab}except Exception as err:\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}return _dabcat_early_failure(\'Unable to load data. Details - {{0}}\'.format(str(err)))\n' \
-        '{tab}{tab}{tab}{tab}{tab}action_result.update_summary(action_result_data[0][\'summary\'])\n' \
-        '{tab}{tab}{tab}{tab}{tab}for data_result in action_result_data:\n' \
-        '{tab}{tab}{tab}{tab}{tab}{tab}if type(data_result[\'data\']) == list:\n' \
-		'{tab}{tab}{tab}{tab}{tab}{tab}{tab}for data_element in data_result[\'data\']:\n' \
-		'{tab}{tab}{tab}{tab}{tab}{tab}{tab}{tab}action_result.add_data(data_element)\n' \
-		'{tab}{tab}{tab}{tab}{tab}{tab}else:\n' \
-		'{tab}{tab}{tab}{tab}{tab}{tab}{tab}action_result.add_data(data_result[\'data\'])\n' \
-        '{tab}{tab}{tab}{tab}{tab}_dabcat_add_other_artifacts(other_artifacts, data_artifact[\'cef\'].get(\'replacerizer\'))\n' \
-        '{tab}{tab}{tab}{tab}{tab}return action_result.set_status(phantom.APP_SUCCESS, \'{{0}}\'.format(action_result_data[0][\'message\']))\n'.format(
-            tab=tab, fail_option=IMPORTANT_SETTINGS['fail_on_data_not_found']
-        )
+        '{tab}{tab}dabcat_status = dabcat_runtime.handle_action(self, param, DABCAT_SETTINGS)\n' \
+        '{tab}{tab}if dabcat_status is not None:\n' \
+        '{tab}{tab}{tab}return dabcat_status\n'.format(tab=tab)
 
     addition = '{addition}{core_capability}{postamble}'.format(addition=addition, core_capability=core_capability, postamble=POSTAMBLE.format(tab=tab))
 
@@ -439,6 +328,26 @@ def process_data():
     )
 
     IMPORTANT_FILES['connector_data'] = final_data
+
+    if IMPORTANT_SETTINGS['param_workers'] > 1:
+        # phantom hands handle_action one param at a time, so the whole list is grabbed from _handle_action for the
+        # runtime to render every param on a thread pool while handle_action adds the results in order
+        handle_action_match = handle_action_re.search(IMPORTANT_FILES['connector_data'])
+        class_names = re.findall(r'^class (\w+)\(', IMPORTANT_FILES['connector_data'][0:handle_action_match.span()[0]], re.MULTILINE)
+        if re.search(r'def _handle_action\(', IMPORTANT_FILES['connector_data']) or not(class_names):
+            output('\tthe connector already overrides _handle_action, parameters will be handled one at a time', 'yellow')
+        else:
+            capture_params_code = \
+                '{tab}def _handle_action(self, in_json, handle):\n' \
+                '{tab}{tab}dabcat_runtime.capture_params(self, in_json, DABCAT_SETTINGS)\n' \
+                '{tab}{tab}return super({class_name}, self)._handle_action(in_json, handle)\n\n'.format(tab=tab, class_name=class_names[-1])
+            insert_at = handle_action_match.span()[0]
+            IMPORTANT_FILES['connector_data'] = IMPORTANT_FILES['connector_data'][0:insert_at] + capture_params_code + IMPORTANT_FILES['connector_data'][insert_at:]
+
+    with open(RUNTIME_FILE, 'r') as runtime_file:
+        IMPORTANT_FILES['runtime_data'] = runtime_file.read()
+    with open(COMMON_FILE, 'r') as common_file:
+        IMPORTANT_FILES['common_data'] = common_file.read()
     
     return
 
@@ -512,6 +421,149 @@ def verify():
     return answer['are_you_sure']
 
 
+def hash_file(file_path):
+    file_hash = hashlib.sha1()
+    with open(file_path, 'rb') as opened_file:
+        for chunk in iter(lambda: opened_file.read(1024 * 1024), b''):
+            file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+
+def empty_build_manifest():
+    return {'files': {}, 'generated': {}, 'input_hash': None}
+
+
+def read_build_manifest(build_manifest_file):
+    try:
+        with open(build_manifest_file, 'r') as opened_manifest:
+            return json.load(opened_manifest)
+    except (IOError, OSError, ValueError):
+        return empty_build_manifest()
+
+
+def compile_file(file_path):
+    # the error goes back as a string, a PyCompileError can't be unpickled on its way out of a pool worker
+    try:
+        py_compile.compile(file_path, doraise=True)
+    except py_compile.PyCompileError as err:
+        return err.msg
+    return None
+
+
+def compile_files(file_paths):
+    # batch builds already run one app per pool worker, and pool workers are not allowed to start a pool of their own
+    if len(file_paths) < 2 or multiprocessing.current_process().daemon:
+        errors = [compile_file(file_path) for file_path in file_paths]
+    else:
+        pool = multiprocessing.Pool(processes=min(len(file_paths), multiprocessing.cpu_count()))
+        try:
+            errors = pool.map(compile_file, file_paths)
+        finally:
+            pool.close()
+            pool.join()
+
+    for file_path, error in zip(file_paths, errors):
+        if error:
+            output('\tunable to compile {}, packaging it anyway; details - {}'.format(file_path, error), 'yellow')
+
+
+def open_gzip_stream(tarball_file):
+    if IMPORTANT_SETTINGS['pigz']:
+        try:
+            pigz = subprocess.Popen(['pigz', '-{}'.format(IMPORTANT_SETTINGS['compresslevel']), '-c'], stdin=subprocess.PIPE, stdout=tarball_file)
+            return pigz.stdin, pigz
+        except OSError:
+            output('pigz was not found, falling back to gzip', 'yellow')
+
+    return gzip.GzipFile(filename='', mode='wb', fileobj=tarball_file, compresslevel=IMPORTANT_SETTINGS['compresslevel']), None
+
+
+def package_files(new_dir, new_name, tarball):
+    # files are streamed into the archive as the tree is walked, and the archive only replaces the old tgz once it is complete
+    tarball_fd, tarball_tmp = tempfile.mkstemp(dir=os.path.dirname(tarball), suffix='.tgz')
+    try:
+        with os.fdopen(tarball_fd, 'wb') as tarball_file:
+            gzip_stream, pigz = open_gzip_stream(tarball_file)
+            try:
+                with tarfile.open(fileobj=gzip_stream, mode='w|') as dummy_tar:
+                    for root, dirs, files in os.walk(new_dir):
+                        dirs.sort()
+                        arc_root = os.path.normpath(os.path.join(new_name, os.path.relpath(root, new_dir)))
+                        dummy_tar.add(root, arcname=arc_root, recursive=False)
+                        for file_name in sorted(files):
+                            dummy_tar.add(os.path.join(root, file_name), arcname=os.path.join(arc_root, file_name), recursive=False)
+            finally:
+                gzip_stream.close()
+                if pigz and pigz.wait() != 0:
+                    raise Exception('pigz exited with status {}'.format(pigz.returncode))
+        os.chmod(tarball_tmp, 0o644)
+        os.rename(tarball_tmp, tarball)
+    except Exception:
+        os.remove(tarball_tmp)
+        raise
+
+
+def get_rest(session, endpoint, params=None):
+    response = session.get('{}rest/{}'.format(IMPORTANT_SETTINGS['phantom_url'], endpoint), params=params, timeout=60)
+    response.raise_for_status()
+    return response
+
+
+def take_snapshot():
+    # exports the demo_configuration containers of the dummy product plus every payload, replacerizer and poll tarball
+    # they point at, so the app can answer from its own files (see dabcat_runtime.get_snapshot)
+    if requests is None:
+        raise Exception('the requests package is needed to take a snapshot')
+    if not IMPORTANT_SETTINGS['phantom_url'] or not os.environ.get('PHANTOM_API_KEY'):
+        raise Exception('a snapshot needs --phantom-url (or PHANTOM_BASE_URL) and PHANTOM_API_KEY')
+    if not IMPORTANT_SETTINGS['phantom_url'].endswith('/'):
+        IMPORTANT_SETTINGS['phantom_url'] += '/'
+
+    session = requests.Session()
+    session.headers.update({'ph-auth-token': os.environ['PHANTOM_API_KEY']})
+    session.verify = False
+
+    product_name = IMPORTANT_FILES['metadata_data']['product_name']
+    actions = {}
+    vault_ids = []
+    for action in [action['identifier'] for action in IMPORTANT_FILES['metadata_data'].get('actions', [])]:
+        containers = get_rest(session, 'container', params=index_params(product_name, action, page_size=0)).json()
+        if not containers['count']:
+            continue
+
+        # the same chunked artifact queries the runtime makes, get_rest raises instead of returning a failure
+        _, artifacts = fetch_container_artifacts(
+            lambda params: (True, get_rest(session, 'artifact', params=params).json()), [container['id'] for container in containers['data']]
+        )
+        for container in containers['data']:
+            for artifact in artifacts[str(container['id'])]:
+                for cef_key in ['dummy_file_vault_id', 'replacerizer'] + (['vaultId'] if artifact['name'].lower().replace(' ', '_') == 'poll_artifact' else []):
+                    if artifact['cef'].get(cef_key) and artifact['cef'][cef_key].strip() not in vault_ids:
+                        vault_ids.append(artifact['cef'][cef_key].strip())
+
+        actions[action] = {'containers': containers, 'artifacts': artifacts}
+
+    payloads = {}
+    payload_data = []
+    payload_size = 0
+    for vault_id in vault_ids:
+        vault_documents = get_rest(session, 'vault_document', params={'_filter_hash': '"{}"'.format(vault_id)}).json()['data']
+        if not vault_documents:
+            output('\tvault id {} was not found, it will be read from the vault at runtime'.format(vault_id), 'yellow')
+            continue
+        payload = get_rest(session, 'vault_document/{}/download'.format(vault_documents[0]['id'])).content
+        payloads[vault_id] = [payload_size, len(payload)]
+        payload_data.append(payload)
+        payload_size += len(payload)
+
+    IMPORTANT_FILES['snapshot_data'] = (
+        json.dumps({'product': product_name, 'actions': actions, 'payloads': payloads}, sort_keys=True),
+        b''.join(payload_data)
+    )
+    output('snapshot taken: {} actions and {} payloads ({} bytes)'.format(len(actions), len(payloads), payload_size), 'blue')
+
+
 def create_files():
 
     new_name = '{}_{}'.format(
@@ -521,27 +573,264 @@ def create_files():
 
     cwd = os.getcwd()
     new_dir = '{}/{}'.format(cwd[:cwd.rfind('/')], new_name)
+    tarball = '{}/{}.tgz'.format(cwd[:cwd.rfind('/')], new_name)
+
+    # content hashes of the last build live next to the output dir, so unchanged files are neither copied nor compiled again.
+    # (size, mtime) matching the last build is trusted without re-hashing the file
+    build_manifest_file = '{}/.{}.dabcat.json'.format(cwd[:cwd.rfind('/')], new_name)
+    last_build = read_build_manifest(build_manifest_file)
+    if not os.path.isdir(new_dir):
+        last_build = empty_build_manifest()
+
+    generated = {
+        os.path.normpath(IMPORTANT_FILES['connector_file']): IMPORTANT_FILES['connector_data'],
+        os.path.normpath(IMPORTANT_FILES['metadata_file']): json.dumps(IMPORTANT_FILES['metadata_data'], indent=4),
+        os.path.basename(RUNTIME_FILE): IMPORTANT_FILES['runtime_data'],
+        os.path.basename(COMMON_FILE): IMPORTANT_FILES['common_data']
+    }
+    if IMPORTANT_FILES['snapshot_data']:
+        generated[os.path.join('dabcat_snapshot', 'index.json')] = IMPORTANT_FILES['snapshot_data'][0]
+        generated[os.path.join('dabcat_snapshot', 'payloads.bin')] = IMPORTANT_FILES['snapshot_data'][1]
+    generated_hashes = dict(
+        (file_name, hashlib.sha1(file_data if isinstance(file_data, bytes) else file_data.encode('utf-8')).hexdigest())
+        for file_name, file_data in generated.items()
+    )
 
-    distutils.dir_util.copy_tree('.', new_dir)
+    files = {}
+    for root, dirs, file_names in os.walk('.'):
+        for file_name in file_names:
+            file_path = os.path.normpath(os.path.join(root, file_name))
+            if file_path in generated:
+                continue
+            file_stat = os.stat(file_path)
+            last_file = last_build['files'].get(file_path)
+            if last_file and last_file[0] == file_stat.st_size and last_file[1] == file_stat.st_mtime:
+                files[file_path] = last_file
+            else:
+                files[file_path] = [file_stat.st_size, file_stat.st_mtime, hash_file(file_path)]
+
+    # packaging options change the tgz without changing any file, so they count as input too
+    input_hash = hashlib.sha1(json.dumps([
+        sorted((file_path, file_info[2]) for file_path, file_info in files.items()),
+        sorted(generated_hashes.items()),
+        [IMPORTANT_SETTINGS['compresslevel'], IMPORTANT_SETTINGS['pigz']]
+    ]).encode('utf-8')).hexdigest()
+
+    if input_hash == last_build['input_hash'] and os.path.exists(tarball):
+        output('nothing changed since the last build - your app is already up to date', 'blue')
+        output('\t{}'.format(tarball), 'cyan')
+        output('\t{} <- source files here'.format(new_dir), 'cyan')
+        return tarball
+
+    changed_files = []
+    for file_path, file_info in files.items():
+        last_file = last_build['files'].get(file_path)
+        if last_file and last_file[2] == file_info[2]:
+            continue
+        if not os.path.isdir(os.path.dirname(os.path.join(new_dir, file_path))):
+            os.makedirs(os.path.dirname(os.path.join(new_dir, file_path)))
+        shutil.copy2(file_path, os.path.join(new_dir, file_path))
+        changed_files.append(file_path)
+
+    for file_path in (set(last_build['files'].keys()) - set(files.keys())) | (set(last_build['generated'].keys()) - set(generated.keys())):
+        try:
+            os.remove(os.path.join(new_dir, file_path))
+        except OSError:
+            pass
+
+    for file_path, file_data in generated.items():
+        if last_build['generated'].get(file_path) == generated_hashes[file_path]:
+            continue
+        if not os.path.isdir(os.path.dirname(os.path.join(new_dir, file_path))):
+            os.makedirs(os.path.dirname(os.path.join(new_dir, file_path)))
+        with open(os.path.join(new_dir, file_path), 'wb+' if isinstance(file_data, bytes) else 'w+') as generated_file:
+            generated_file.write(file_data)
+        changed_files.append(file_path)
+
+    compile_files([os.path.join(new_dir, file_path) for file_path in changed_files if file_path.endswith('.py')])
+    package_files(new_dir, new_name, tarball)
+
+    with open(build_manifest_file, 'w') as opened_manifest:
+        json.dump({'files': files, 'generated': generated_hashes, 'input_hash': input_hash}, opened_manifest)
 
-    with open('{}/{}'.format(new_dir, IMPORTANT_FILES['connector_file']), 'w+') as connector_file:
-        connector_file.write(IMPORTANT_FILES['connector_data'])
+    output('congratulations! you\'re done - go try out your shiny new app', 'blue')
+    output('\t{}'.format(tarball), 'cyan')
+    output('\t{} <- source files here'.format(new_dir), 'cyan')
+    return tarball
 
-    with open('{}/{}'.format(new_dir, IMPORTANT_FILES['metadata_file']), 'w+') as metadata_file:
-        metadata_file.write(json.dumps(IMPORTANT_FILES['metadata_data'], indent=4))
 
-    for root, dirs, files in os.walk(new_dir):
-        for file_name in files:
-            if file_name.endswith('.py'):
-                py_compile.compile('{}/{}'.format(new_dir, file_name))
-    
-    with tarfile.open('{}/{}.tgz'.format(cwd[:cwd.rfind('/')], new_name), mode='w:gz') as dummy_tar:
-        dummy_tar.add(new_dir, arcname=new_name)
+def find_imports(code, file_name):
+    # (module, function) for every import in the code, function is None for imports paid when the module is loaded
+    imports = []
 
-    output('congratulations! you\'re done - go try out your shiny new app', 'blue')
-    output('\t{}/{}.tgz'.format(cwd[:cwd.rfind('/')], new_name), 'cyan')
-    output('\t{} <- source files here'.format(new_dir), 'cyan')
-    return
+    def visit(node, function):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, ast.Import):
+                imports.extend((alias.name, function) for alias in child.names)
+            elif isinstance(child, ast.ImportFrom) and child.module and not(child.level):
+                imports.append((child.module, function))
+            visit(child, function or (child.name if isinstance(child, (ast.FunctionDef, getattr(ast, 'AsyncFunctionDef', ast.FunctionDef))) else None))
+
+    try:
+        visit(ast.parse(code, file_name), None)
+    except SyntaxError as err:
+        output('\tunable to read the imports of {}; details - {}'.format(file_name, str(err)), 'yellow')
+    return imports
+
+
+def time_import(module_name):
+    # a fresh interpreter for every module, the same as the fresh process phantom starts for every action
+    timings = []
+    for _ in range(3):
+        try:
+            timings.append(float(subprocess.check_output(
+                [sys.executable, '-c', 'import time; start = time.time(); import {}; print(time.time() - start)'.format(module_name)],
+                stderr=subprocess.STDOUT
+            ).decode('utf-8').strip().splitlines()[-1]))
+        except (subprocess.CalledProcessError, ValueError, IndexError):
+            return None
+    return round(min(timings) * 1000, 2)
+
+
+def report_imports(tarball):
+    code_files = [
+        (os.path.basename(IMPORTANT_FILES['connector_file']), IMPORTANT_FILES['connector_data']),
+        (os.path.basename(RUNTIME_FILE), IMPORTANT_FILES['runtime_data']),
+        (os.path.basename(COMMON_FILE), IMPORTANT_FILES['common_data'])
+    ]
+    local_modules = [os.path.splitext(file_name)[0] for file_name, _ in code_files]
+
+    report = []
+    for file_name, code in code_files:
+        for module_name, function in find_imports(code, file_name):
+            if module_name.split('.')[0] in local_modules or any(entry['module'] == module_name and entry['file'] == file_name and entry['function'] == function for entry in report):
+                continue
+            report.append({'module': module_name, 'file': file_name, 'function': function, 'ms': None})
+
+    timings = {}
+    for entry in report:
+        if entry['module'] not in timings:
+            timings[entry['module']] = time_import(entry['module'])
+        entry['ms'] = timings[entry['module']]
+    report.sort(key=lambda entry: (entry['function'] is not None, -(entry['ms'] or 0)))
+
+    startup_ms = round(sum(timings[module_name] or 0 for module_name in set(entry['module'] for entry in report if entry['function'] is None)), 2)
+    output('import report (cold import of each module with {}, modules shared between imports are counted for each one):'.format(sys.executable), 'blue')
+    for entry in report:
+        output('\t{:>10} {} ({}{})'.format(
+            'n/a' if entry['ms'] is None else '{} ms'.format(entry['ms']),
+            entry['module'],
+            entry['file'],
+            ', only when {}() runs'.format(entry['function']) if entry['function'] else ''
+        ), 'cyan' if entry['function'] else 'yellow')
+    output('\t{:>10} at most, paid by every action before it runs (n/a means not installed here)'.format('{} ms'.format(startup_ms)), 'blue')
+
+    report_file = '{}/.{}.dabcat_imports.json'.format(os.path.dirname(tarball), os.path.basename(tarball)[:-len('.tgz')])
+    with open(report_file, 'w') as opened_report:
+        json.dump({'startup_ms': startup_ms, 'imports': report}, opened_report, indent=4)
+    return startup_ms
+
+
+def read_manifest(manifest_file):
+    with open(manifest_file, 'r') as opened_manifest:
+        manifest = json.load(opened_manifest)
+
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_file))
+    for entry in manifest:
+        missing_keys = [key for key in ['app_dir', 'name', 'product_name', 'appid'] if not entry.get(key)]
+        if missing_keys:
+            raise Exception('manifest entry {} is missing {}'.format(entry.get('app_dir'), ', '.join(missing_keys)))
+        entry['app_dir'] = os.path.join(manifest_dir, entry['app_dir'])
+        entry['log_file'] = os.path.join(manifest_dir, 'dabcat_logs', '{}.log'.format(os.path.basename(os.path.normpath(entry['app_dir']))))
+
+    return manifest
+
+
+def build_app(entry):
+    # runs in a pool worker, which may have built another app before this one, so start from a clean slate
+    for key in IMPORTANT_FILES.keys():
+        IMPORTANT_FILES[key] = [] if key == 'dummy_data' else None
+    IMPORTANT_SETTINGS['fail_on_data_not_found'] = entry.get('fail_option', False)
+
+    result = {'app_dir': entry['app_dir'], 'log_file': entry['log_file'], 'success': False, 'tarball': None, 'error': None}
+    start_time = time.time()
+    stdout = sys.stdout
+
+    if not os.path.exists(os.path.dirname(entry['log_file'])):
+        try:
+            os.makedirs(os.path.dirname(entry['log_file']))
+        except OSError:
+            pass
+
+    with open(entry['log_file'], 'w') as log_file:
+        sys.stdout = log_file
+        try:
+            os.chdir(entry['app_dir'])
+            if not check_folder():
+                raise Exception('no connector or metadata file found in {}'.format(entry['app_dir']))
+            read_important_files()
+
+            IMPORTANT_FILES['metadata_data']['name'] = entry['name']
+            IMPORTANT_FILES['metadata_data']['product_name'] = entry['product_name']
+            IMPORTANT_FILES['metadata_data']['appid'] = entry['appid']
+
+            process_data()
+            if IMPORTANT_SETTINGS['snapshot']:
+                take_snapshot()
+            result['tarball'] = create_files()
+            if IMPORTANT_SETTINGS['import_report']:
+                result['startup_ms'] = report_imports(result['tarball'])
+            result['success'] = True
+        except Exception as err:
+            result['error'] = str(err)
+            output('unable to build {}; details - {}'.format(entry['app_dir'], str(err)), 'red')
+        finally:
+            sys.stdout = stdout
+
+    result['seconds'] = round(time.time() - start_time, 2)
+    return result
+
+
+def init_worker(settings):
+    IMPORTANT_SETTINGS.update(settings)
+
+
+def build_manifest(manifest_file, workers):
+    try:
+        manifest = read_manifest(manifest_file)
+    except Exception as err:
+        output('unable to read manifest, exiting DABCAT; details - {}'.format(str(err)), 'red')
+        return False
+
+    output('building {} apps with {} workers'.format(len(manifest), workers), 'blue')
+
+    start_time = time.time()
+    # pool workers get the command line settings handed to them rather than relying on them being forked along. the
+    # initializer has to be a module level function, a bound IMPORTANT_SETTINGS.update would update a pickled copy under spawn
+    pool = multiprocessing.Pool(
+        processes=max(1, min(workers, len(manifest))),
+        initializer=init_worker,
+        initargs=(dict((setting_key, IMPORTANT_SETTINGS[setting_key]) for setting_key in ['compresslevel', 'pigz', 'metrics', 'snapshot', 'phantom_url', 'import_report', 'param_workers']),)
+    )
+    try:
+        results = pool.map(build_app, manifest, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    for result in results:
+        if result['success']:
+            output('\t[ok] {} ({}s) -> {}'.format(result['app_dir'], result['seconds'], result['tarball']), 'cyan')
+        else:
+            output('\t[failed] {} ({}s) - {} (see {})'.format(result['app_dir'], result['seconds'], result['error'], result['log_file']), 'red')
+
+    failures = len([result for result in results if not result['success']])
+    output('built {} of {} apps in {}s'.format(len(results) - failures, len(results), round(time.time() - start_time, 2)), 'blue' if not failures else 'red')
+
+    with open(os.path.join(os.path.dirname(os.path.abspath(manifest_file)), 'dabcat_summary.json'), 'w') as summary_file:
+        json.dump(results, summary_file, indent=4)
+
+    return failures == 0
 
 
 def read_dummy_data(file_name):
@@ -558,11 +847,21 @@ def read_dummy_data(file_name):
     return dummy_data
 
 
-def replacerize(file_data):
-    for replace_value in IMPORTANT_FILES['replacerizer_data'].keys():
-        file_data = file_data.replace(replace_value, IMPORTANT_FILES['replacerizer_data'][replace_value])
+def compile_replacerizer(replacerizer_data):
+    replacements = dict((key, u'{}'.format(value)) for key, value in replacerizer_data.items() if key)
+    if not replacements:
+        return lambda file_data: file_data
+
+    replacerizer_pattern = re.compile(literal_pattern(replacements.keys()))
 
-    return file_data
+    return lambda file_data: replacerizer_pattern.sub(lambda match: replacements[match.group()], file_data)
+
+
+def replacerize(file_data):
+    # compiled the first time it's needed after the replacerizer file is read, not for every file it's applied to
+    if IMPORTANT_FILES['replacerizer'] is None:
+        IMPORTANT_FILES['replacerizer'] = compile_replacerizer(IMPORTANT_FILES['replacerizer_data'])
+    return IMPORTANT_FILES['replacerizer'](file_data)
 
 
 def get_confirmation(message):
@@ -580,11 +879,32 @@ def get_confirmation(message):
 
 
 @click.command()
-def main():
+@click.option('--manifest', type=click.Path(exists=True, dir_okay=False), default=None, help='JSON manifest of apps to build without prompting')
+@click.option('--workers', type=int, default=multiprocessing.cpu_count(), help='number of apps to build at once when using --manifest')
+@click.option('--compresslevel', type=click.IntRange(1, 9), default=IMPORTANT_SETTINGS['compresslevel'], help='gzip compression level of the app tgz')
+@click.option('--pigz', is_flag=True, default=False, help='compress the app tgz with pigz (multi-threaded gzip) when it is installed')
+@click.option('--metrics', is_flag=True, default=False, help='have the app report phase timings and counters in every action result summary')
+@click.option('--snapshot', is_flag=True, default=False, help='bundle the demo_configuration data and payloads into the app so it works without REST calls')
+@click.option('--phantom-url', default=lambda: os.environ.get('PHANTOM_BASE_URL'), help='Phantom to take the snapshot from (default $PHANTOM_BASE_URL)')
+@click.option('--import-report', is_flag=True, default=False, help='time the imports of the generated connector and runtime to show what every action pays on startup')
+@click.option('--param-workers', type=click.IntRange(0, None), default=0, help='render the parameters of multi-parameter actions on this many threads (0 or 1 handles them one at a time)')
+def main(manifest, workers, compresslevel, pigz, metrics, snapshot, phantom_url, import_report, param_workers):
+    IMPORTANT_SETTINGS['param_workers'] = param_workers
+    IMPORTANT_SETTINGS['import_report'] = import_report
+    IMPORTANT_SETTINGS['snapshot'] = snapshot
+    IMPORTANT_SETTINGS['phantom_url'] = phantom_url
+    IMPORTANT_SETTINGS['compresslevel'] = compresslevel
+    IMPORTANT_SETTINGS['pigz'] = pigz
+    IMPORTANT_SETTINGS['metrics'] = metrics
     
     cat_banner()
     output('DABCAT2.0', 'green', figlet=True)
     output('Dummy App Builder for Code And Transforms (Now Improved with Version 2.0)\n\n', 'green')
+
+    if manifest:
+        if not build_manifest(manifest, workers):
+            sys.exit(1)
+        return
     
     any_known = check_folder()
     if any_known:
@@ -603,7 +923,15 @@ def main():
     if not(verify()):
         output('i\'m so sorry this didn\'t work out - please come back and try again later', 'red')
         return
-    create_files()
+    if IMPORTANT_SETTINGS['snapshot']:
+        try:
+            take_snapshot()
+        except Exception as err:
+            output('unable to take a snapshot, exiting DABCAT; details - {}'.format(str(err)), 'red')
+            return
+    tarball = create_files()
+    if IMPORTANT_SETTINGS['import_report']:
+        report_imports(tarball)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,267 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import tarfile
+import hashlib
+import tempfile
+import importlib
+import collections
+
+import click
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import dabcat2
+from dabcat_mock import MockPhantom
+
+# runs the connector code generated by dabcat2.process_data() against dabcat_mock.MockPhantom and reports latency
+# percentiles, REST and vault_info call counts and peak memory for a set of demo_configuration scenarios
+
+PRODUCT_NAME = 'DABCAT Bench'
+
+CONNECTOR_TEMPLATE = '''import phantom.app as phantom
+from phantom.base_connector import BaseConnector
+from phantom.action_result import ActionResult
+
+
+class BenchConnector(BaseConnector):
+
+    def __init__(self):
+        super(BenchConnector, self).__init__()
+
+    def initialize(self):
+        return phantom.APP_SUCCESS
+
+    def finalize(self):
+        return phantom.APP_SUCCESS
+
+    def handle_action(self, param):
+        return phantom.APP_SUCCESS
+'''
+
+
+def action_results(data, summary, message):
+    return json.dumps([{'data': data, 'summary': summary, 'message': message, 'status': 'success', 'parameter': {}}])
+
+
+def add_criteria(mock, action, criteria_cef, other_artifacts=None):
+    container_id = mock.add_container(name=PRODUCT_NAME, description=action)
+    mock.add_artifact(container_id, 'matching criteria', criteria_cef)
+    for artifact_name, artifact_cef in other_artifacts or []:
+        mock.add_artifact(container_id, artifact_name, artifact_cef)
+    return container_id
+
+
+def seed_many_containers(mock, scale):
+    vault_id = mock.add_vault_file(action_results([{'positives': 0}], {'positives': 0}, 'clean'), 'clean.json')
+    container_count = int(2000 * scale)
+    for index in range(container_count):
+        add_criteria(mock, 'lookup_url', {'url': 'http://host{0}.example.com'.format(index), 'dummy_file_vault_id': vault_id})
+    step = max(1, container_count // 20)
+    return 'lookup_url', [{'url': 'http://host{0}.example.com'.format(index)} for index in range(0, container_count, step)]
+
+
+def seed_large_payload(mock, scale):
+    data = [{'id': index, 'url': 'http://large.example.com/{0}'.format(index), 'tags': ['bench', 'large'], 'score': index % 100} for index in range(int(200000 * scale))]
+    vault_id = mock.add_vault_file(action_results(data, {'total': len(data)}, 'large'), 'large.json')
+    add_criteria(mock, 'lookup_url', {'url': 'http://large.example.com', 'dummy_file_vault_id': vault_id})
+    return 'lookup_url', [{'url': 'http://large.example.com'}]
+
+
+def seed_big_replacerizer(mock, scale):
+    key_count = int(5000 * scale)
+    replacerizer = dict(('token{0}'.format(index), 'replaced{0} ***url***'.format(index)) for index in range(key_count))
+    replacerizer_id = mock.add_vault_file(json.dumps(replacerizer), 'replacerizer.json')
+    data = [{'note': 'token{0} and token{1}'.format(index, (index * 7) % key_count)} for index in range(int(20000 * scale))]
+    vault_id = mock.add_vault_file(action_results(data, {'total': len(data)}, 'replacerized token1'), 'replacerized.json')
+    add_criteria(mock, 'lookup_url', {'url': 'http://replacerizer.example.com', 'dummy_file_vault_id': vault_id, 'replacerizer': replacerizer_id})
+    return 'lookup_url', [{'url': 'http://replacerizer.example.com'}]
+
+
+def seed_on_poll(mock, scale):
+    container_id = mock.add_container(name=PRODUCT_NAME, description='on_poll')
+    for poll_index in range(int(20 * scale) or 1):
+        attachments = [os.urandom(64 * 1024) for _ in range(3)]
+        container_json = json.dumps({
+            'container': {'id': poll_index, 'name': 'incident {0}'.format(poll_index), 'label': 'events'},
+            'artifacts': [{'id': artifact_index, 'name': 'artifact', 'cef': {'index': artifact_index}} for artifact_index in range(10)],
+            'vault_documents': [{'hash': hashlib.sha1(attachment).hexdigest(), 'names': ['file{0}.bin'.format(index)]} for index, attachment in enumerate(attachments)]
+        }).encode('utf-8')
+        tar_buffer = io.BytesIO()
+        with tarfile.open(fileobj=tar_buffer, mode='w:gz') as poll_tar:
+            for member_name, member_data in [('container.json', container_json)] + [(hashlib.sha1(attachment).hexdigest(), attachment) for attachment in attachments]:
+                member = tarfile.TarInfo('incident/{0}'.format(member_name))
+                member.size = len(member_data)
+                poll_tar.addfile(member, io.BytesIO(member_data))
+        vault_id = mock.add_vault_file(tar_buffer.getvalue(), 'incident{0}.tgz'.format(poll_index))
+        mock.add_artifact(container_id, 'poll artifact', {'vaultId': vault_id, 'label': 'events'})
+    return 'on_poll', [{}]
+
+
+def seed_many_params(mock, scale):
+    for index in range(50):
+        vault_id = mock.add_vault_file(action_results([{'ip': '10.0.0.{0}'.format(index)}], {'index': index}, 'ip {0}'.format(index)), 'ip{0}.json'.format(index))
+        add_criteria(mock, 'lookup_ip', {'ip': '10.0.0.{0}'.format(index), 'dummy_file_vault_id': vault_id})
+    return 'lookup_ip', [{'ip': '10.0.0.{0}'.format(index % 50)} for index in range(int(500 * scale) or 1)]
+
+
+SCENARIOS = collections.OrderedDict([
+    ('many_containers', seed_many_containers),
+    ('large_payload', seed_large_payload),
+    ('big_replacerizer', seed_big_replacerizer),
+    ('on_poll', seed_on_poll),
+    ('many_params', seed_many_params)
+])
+
+
+def generate_connector(work_dir, action, snapshot_url=None):
+    # the scenario app is built the same way dabcat2.py builds any other app, discovery through create_files(), so the copy,
+    # compile and package steps run on every bench too. returns the generated <name>_dummy source dir
+    app_dir = os.path.join(work_dir, 'bench_app')
+    os.makedirs(app_dir)
+    with open(os.path.join(app_dir, 'bench_connector.py'), 'w') as connector_file:
+        connector_file.write(CONNECTOR_TEMPLATE)
+    with open(os.path.join(app_dir, 'bench.json'), 'w') as metadata_file:
+        json.dump({'name': PRODUCT_NAME, 'product_name': PRODUCT_NAME, 'appid': 'dabcat-bench', 'actions': [{'identifier': action}]}, metadata_file, indent=4)
+
+    for key in dabcat2.IMPORTANT_FILES.keys():
+        dabcat2.IMPORTANT_FILES[key] = [] if key == 'dummy_data' else None
+    dabcat2.IMPORTANT_SETTINGS['fail_on_data_not_found'] = True
+    dabcat2.IMPORTANT_SETTINGS['phantom_url'] = snapshot_url
+
+    cwd = os.getcwd()
+    stdout = sys.stdout
+    with open(os.path.join(work_dir, 'build.log'), 'w') as log_file:
+        sys.stdout = log_file
+        try:
+            os.chdir(app_dir)
+            if not dabcat2.check_folder():
+                raise Exception('no connector or metadata file found in {0}'.format(app_dir))
+            dabcat2.read_important_files()
+            dabcat2.process_data()
+            if snapshot_url:
+                dabcat2.take_snapshot()
+            tarball = dabcat2.create_files()
+        finally:
+            sys.stdout = stdout
+            os.chdir(cwd)
+
+    return os.path.splitext(tarball)[0]
+
+
+def load_connector(app_dir):
+    # a fresh import means fresh runtime module state, which is what a new action process on Phantom starts with
+    for module_name in ['bench_connector', 'dabcat_runtime', 'dabcat_common']:
+        sys.modules.pop(module_name, None)
+    if app_dir not in sys.path:
+        sys.path.insert(0, app_dir)
+    connector_module = importlib.import_module('bench_connector')
+    with open(os.path.join(app_dir, 'bench.json'), 'r') as metadata_file:
+        connector_module.BenchConnector.APP_JSON = json.load(metadata_file)
+    return connector_module
+
+
+def run_connector(connector_module, action, params):
+    connector = connector_module.BenchConnector()
+    results = json.loads(connector._handle_action(json.dumps({'identifier': action, 'parameters': params}), None))
+    return [result for result in results if result['status'] != True]
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(percent / 100.0 * len(ordered) + 0.5)) - 1))]
+
+
+def run_scenario(scenario, scale, iterations, cold, snapshot):
+    mock = MockPhantom()
+    work_dir = tempfile.mkdtemp(prefix='dabcat_bench_')
+    app_dir = None
+    try:
+        mock.start()
+        mock.install()
+        action, params = SCENARIOS[scenario](mock, scale)
+        app_dir = generate_connector(work_dir, action, mock.base_url if snapshot else None)
+        connector_module = load_connector(app_dir)
+        cache_dir = os.path.join(mock.vault_dir, 'tmp', 'dabcat_cache')
+
+        latencies = []
+        rest_calls = []
+        vault_info_calls = []
+        failures = 0
+        for _ in range(iterations):
+            if cold:
+                shutil.rmtree(cache_dir, ignore_errors=True)
+                connector_module = load_connector(app_dir)
+            mock.reset_counters()
+            start_time = time.time()
+            failures += len(run_connector(connector_module, action, params))
+            latencies.append((time.time() - start_time) * 1000)
+            rest_calls.append(len(mock.calls))
+            vault_info_calls.append(mock.vault_info_calls)
+
+        # memory is measured on a separate run since tracing slows everything else down
+        peak_mb = None
+        if tracemalloc:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            connector_module = load_connector(app_dir)
+            tracemalloc.start()
+            try:
+                run_connector(connector_module, action, params)
+                peak_mb = tracemalloc.get_traced_memory()[1] / 1024.0 / 1024.0
+            finally:
+                tracemalloc.stop()
+
+        return {
+            'scenario': scenario,
+            'params': len(params),
+            'iterations': iterations,
+            'failures': failures,
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p90_ms': round(percentile(latencies, 90), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'max_ms': round(max(latencies), 2),
+            'rest_calls': round(sum(rest_calls) / float(len(rest_calls)), 2),
+            'vault_info_calls': round(sum(vault_info_calls) / float(len(vault_info_calls)), 2),
+            'peak_mb': round(peak_mb, 2) if peak_mb is not None else None
+        }
+    finally:
+        mock.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+        if app_dir in sys.path:
+            sys.path.remove(app_dir)
+
+
+@click.command()
+@click.option('--scenario', 'scenarios', multiple=True, type=click.Choice(list(SCENARIOS.keys())), help='scenario to run (default all, can be repeated)')
+@click.option('--iterations', type=int, default=10, help='connector runs per scenario')
+@click.option('--scale', type=float, default=1.0, help='multiplier for the size of every scenario')
+@click.option('--cold', is_flag=True, default=False, help='start every run with an empty cache, like a brand new action process')
+@click.option('--param-workers', type=int, default=0, help='build the app with dabcat2.py --param-workers')
+@click.option('--snapshot', is_flag=True, default=False, help='build the app with dabcat2.py --snapshot, so the demo data comes from the app itself')
+@click.option('--json', 'json_file', type=click.Path(dir_okay=False), default=None, help='also write the results to this file')
+def main(scenarios, iterations, scale, cold, param_workers, snapshot, json_file):
+    dabcat2.IMPORTANT_SETTINGS['param_workers'] = param_workers
+    results = []
+    columns = ['scenario', 'params', 'failures', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'rest_calls', 'vault_info_calls', 'peak_mb']
+    print('  '.join(column.rjust(16) for column in columns))
+    for scenario in scenarios or SCENARIOS.keys():
+        result = run_scenario(scenario, scale, iterations, cold, snapshot)
+        results.append(result)
+        print('  '.join(str(result[column]).rjust(16) for column in columns))
+
+    if json_file:
+        with open(json_file, 'w') as opened_json:
+            json.dump(results, opened_json, indent=4)
+
+    if any(result['failures'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
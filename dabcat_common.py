@@ -0,0 +1,91 @@
+import re
+import json
+
+# code both dabcat2.py and the dabcat runtime need. it must not import phantom (dabcat2.py runs outside of phantom) and is copied
+# into every "dummy" app next to dabcat_runtime.py, so it has to run on the same pythons the runtime does
+
+# replacerizer tries nesting deeper than this are matched as a plain alternation, the re parser recurses once per group
+LITERAL_TRIE_MAX_DEPTH = 100
+
+# demo_configuration artifacts are fetched for this many containers per _filter_container_id__in query (keeping the url short),
+# this many artifacts per page
+ARTIFACT_CHUNK_SIZE = 100
+ARTIFACT_PAGE_SIZE = 1000
+
+
+def literal_pattern(literals):
+    # a character trie of the literals turned into one regex, so a single scan finds the longest literal at each position.
+    # built bottom up without recursion and with single child runs collapsed, since keys can be far longer than the recursion
+    # limit. tries that would nest deeper than the re module can parse fall back to a longest first alternation
+    trie = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def chain(char, node):
+        chars = [char]
+        while len(node) == 1 and '' not in node:
+            char = list(node.keys())[0]
+            chars.append(char)
+            node = node[char]
+        return u''.join(chars), node
+
+    patterns = {}
+    stack = [(trie, False)]
+    while stack:
+        node, visited = stack.pop()
+        branches = [chain(char, node[char]) for char in sorted(node.keys()) if char]
+        if not(visited):
+            stack.append((node, True))
+            stack.extend((child, False) for _, child in branches)
+            continue
+        branch_patterns = [(re.escape(label) + patterns[id(child)][0], patterns[id(child)][1]) for label, child in branches]
+        depth = max([branch_depth for _, branch_depth in branch_patterns] or [0])
+        if not(branch_patterns):
+            patterns[id(node)] = (u'', 0)
+        elif len(branch_patterns) == 1 and '' not in node:
+            patterns[id(node)] = (branch_patterns[0][0], depth)
+        else:
+            patterns[id(node)] = (u'(?:{0}){1}'.format(u'|'.join(pattern for pattern, _ in branch_patterns), u'?' if '' in node else u''), depth + 1)
+
+    pattern, depth = patterns[id(trie)]
+    if depth > LITERAL_TRIE_MAX_DEPTH:
+        return u'|'.join(re.escape(literal) for literal in sorted(literals, key=len, reverse=True))
+    return pattern
+
+
+def index_params(product, action, **params):
+    params.update({'_filter_label': '"demo_configuration"', '_filter_name': '"{0}"'.format(product), '_filter_description': '"{0}"'.format(action)})
+    return params
+
+
+def iter_artifacts(get_artifact_page, container_ids):
+    # get_artifact_page(params) does the rest/artifact call and returns (success, page or message), the runtime goes through
+    # the connector's session and dabcat2.py through its own
+    for chunk_start in range(0, len(container_ids), ARTIFACT_CHUNK_SIZE):
+        container_id_chunk = container_ids[chunk_start:chunk_start + ARTIFACT_CHUNK_SIZE]
+        page = 0
+        num_pages = 1
+        while page < num_pages:
+            artifact_params = {'_filter_container_id__in': json.dumps(container_id_chunk), 'page_size': ARTIFACT_PAGE_SIZE, 'page': page, 'sort': 'id', 'order': 'asc'}
+            success, artifact_page = get_artifact_page(artifact_params)
+            if not(success):
+                yield False, artifact_page
+                return
+            for artifact in artifact_page['data']:
+                yield True, artifact
+            num_pages = artifact_page.get('num_pages', 0)
+            page += 1
+
+
+def fetch_container_artifacts(get_artifact_page, container_ids):
+    # the artifacts of every container, keyed by the container id as a string (the way they come back out of json)
+    artifacts = dict((str(container_id), []) for container_id in container_ids)
+    for success, artifact in iter_artifacts(get_artifact_page, container_ids):
+        if not(success):
+            return False, artifact
+        artifacts.setdefault(str(artifact.get('container_id', artifact.get('container'))), []).append(artifact)
+
+    return True, artifacts
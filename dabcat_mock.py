@@ -0,0 +1,379 @@
+import os
+import sys
+import json
+import types
+import shutil
+import hashlib
+import datetime
+import tempfile
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qsl
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qsl
+
+# a local stand-in for the parts of Phantom a DABCAT2.0 "dummy" app talks to: rest/container, rest/artifact and
+# rest/vault_document (with downloads) with Phantom's filter and pagination semantics, plus phantom.app, phantom.rules, phantom.vault, phantom.action_result and
+# phantom.base_connector modules backed by a temp dir vault. used by dabcat_bench.py, never shipped in an app
+
+APP_SUCCESS = True
+APP_ERROR = False
+
+
+def update_time():
+    return datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def filter_value(value):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def filter_match(record, field, operator, value):
+    record_value = record.get(field)
+    if operator == 'in':
+        return record_value in value
+    if record_value is None and operator != 'eq':
+        return False
+    if operator == 'gt':
+        return record_value > value
+    if operator == 'gte':
+        return record_value >= value
+    if operator == 'lt':
+        return record_value < value
+    if operator == 'lte':
+        return record_value <= value
+
+    return record_value == value
+
+
+class MockPhantom(object):
+    def __init__(self, vault_dir=None):
+        self.vault_dir = vault_dir or tempfile.mkdtemp(prefix='dabcat_mock_')
+        self.records = {'container': [], 'artifact': [], 'vault_document': []}
+        self.vault = {}
+        self.calls = []
+        self.attachments = []
+        self.vault_info_calls = 0
+        self.server = None
+        self.base_url = None
+        self.lock = threading.Lock()
+
+    def add_container(self, **container):
+        with self.lock:
+            container.setdefault('id', len(self.records['container']) + 1)
+            container.setdefault('label', 'demo_configuration')
+            container.setdefault('container_update_time', update_time())
+            self.records['container'].append(container)
+        return container['id']
+
+    def update_container(self, container_id, **fields):
+        # editing the container's own fields moves its container_update_time forward, artifact changes move its
+        # artifact_update_time instead (see touch_artifacts)
+        with self.lock:
+            for container in self.records['container']:
+                if container['id'] == container_id:
+                    container.update(fields)
+                    container['container_update_time'] = update_time()
+
+    def delete_container(self, container_id):
+        with self.lock:
+            self.records['container'] = [container for container in self.records['container'] if container['id'] != container_id]
+            self.records['artifact'] = [artifact for artifact in self.records['artifact'] if artifact['container_id'] != container_id]
+
+    def add_artifact(self, container_id, name, cef, **artifact):
+        with self.lock:
+            artifact.setdefault('id', len(self.records['artifact']) + 1)
+            artifact.update({'container_id': container_id, 'container': container_id, 'name': name, 'cef': cef, 'update_time': update_time()})
+            self.records['artifact'].append(artifact)
+            self.touch_artifacts(container_id, artifact['update_time'])
+        return artifact['id']
+
+    def update_artifact(self, artifact_id, **fields):
+        with self.lock:
+            for artifact in self.records['artifact']:
+                if artifact['id'] == artifact_id:
+                    artifact.update(fields)
+                    artifact['update_time'] = update_time()
+                    self.touch_artifacts(artifact['container_id'], artifact['update_time'])
+
+    def touch_artifacts(self, container_id, artifact_update_time):
+        # phantom keeps the time of the last artifact change on the container, called with the lock held
+        for container in self.records['container']:
+            if container['id'] == container_id:
+                container['artifact_update_time'] = artifact_update_time
+
+    def add_vault_file(self, data, file_name):
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        vault_id = hashlib.sha1(data).hexdigest()
+        file_dir = os.path.join(self.vault_dir, 'files')
+        if not os.path.exists(file_dir):
+            os.makedirs(file_dir)
+        file_path = os.path.join(file_dir, vault_id)
+        with open(file_path, 'wb') as vault_file:
+            vault_file.write(data)
+        with self.lock:
+            self.vault[vault_id] = {'vault_id': vault_id, 'name': file_name, 'path': file_path, 'size': len(data)}
+            self.records['vault_document'].append({'id': len(self.records['vault_document']) + 1, 'hash': vault_id, 'name': file_name, 'size': len(data)})
+        return vault_id
+
+    def query(self, endpoint, params):
+        with self.lock:
+            records = list(self.records.get(endpoint, []))
+
+        for param_key, param_value in params.items():
+            if not param_key.startswith('_filter_'):
+                continue
+            field = param_key[len('_filter_'):]
+            operator = 'eq'
+            if '__' in field:
+                field, operator = field.rsplit('__', 1)
+            value = filter_value(param_value)
+            records = [record for record in records if filter_match(record, field, operator, value)]
+
+        records.sort(key=lambda record: record.get(params.get('sort', 'id')), reverse=params.get('order') == 'desc')
+        page_size = int(params.get('page_size', 10))
+        page = int(params.get('page', 0))
+        if page_size == 0:
+            data = records
+            num_pages = 1
+        else:
+            data = records[page * page_size:(page + 1) * page_size]
+            num_pages = (len(records) + page_size - 1) // page_size
+
+        return {'count': len(records), 'num_pages': num_pages, 'data': data}
+
+    def start(self):
+        mock = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                path = url.path.strip('/').split('/')
+                endpoint = path[1] if len(path) > 1 and path[0] == 'rest' else path[-1]
+                params = dict(parse_qsl(url.query))
+                with mock.lock:
+                    mock.calls.append((endpoint, params))
+                content_type = 'application/json'
+                if endpoint not in mock.records:
+                    status, body = 404, {'failed': True, 'message': 'unknown endpoint {0}'.format(endpoint)}
+                elif endpoint == 'vault_document' and path[-1] == 'download':
+                    status, body = 404, {'failed': True, 'message': 'vault document {0} not found'.format(path[-2])}
+                    for vault_document in mock.records['vault_document']:
+                        if str(vault_document['id']) == path[-2]:
+                            with open(mock.vault[vault_document['hash']]['path'], 'rb') as vault_file:
+                                status, body, content_type = 200, vault_file.read(), 'application/octet-stream'
+                else:
+                    status, body = 200, mock.query(endpoint, params)
+                if not(isinstance(body, bytes)):
+                    body = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+        self.server = Server(('127.0.0.1', 0), RequestHandler)
+        server_thread = threading.Thread(target=self.server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+        self.base_url = 'http://127.0.0.1:{0}/'.format(self.server.server_address[1])
+        return self.base_url
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        shutil.rmtree(self.vault_dir, ignore_errors=True)
+
+    def reset_counters(self):
+        with self.lock:
+            self.calls = []
+            self.attachments = []
+            self.vault_info_calls = 0
+
+    def install(self):
+        # registers the mock phantom package, so it has to happen before a generated connector or dabcat_runtime is imported
+        os.environ['PHANTOM_API_KEY'] = os.environ.get('PHANTOM_API_KEY', 'dabcat-mock')
+        os.environ['PHANTOM_BASE_URL'] = self.base_url or self.start()
+        for module_name, module in build_modules(self).items():
+            sys.modules[module_name] = module
+
+
+def build_modules(mock):
+    phantom_package = types.ModuleType('phantom')
+    phantom_package.__path__ = []
+
+    app_module = types.ModuleType('phantom.app')
+    app_module.APP_SUCCESS = APP_SUCCESS
+    app_module.APP_ERROR = APP_ERROR
+
+    class ActionResult(object):
+        def __init__(self, param=None):
+            self.param = param or {}
+            self.data = []
+            self.summary = {}
+            self.status = None
+            self.message = None
+
+        def add_data(self, data):
+            self.data.append(data)
+
+        def update_summary(self, summary):
+            self.summary.update(summary or {})
+            return self.summary
+
+        def set_status(self, status, message=None):
+            self.status = status
+            self.message = message
+            return status
+
+        def get_status(self):
+            return self.status
+
+        def get_message(self):
+            return self.message
+
+    action_result_module = types.ModuleType('phantom.action_result')
+    action_result_module.ActionResult = ActionResult
+
+    class Vault(object):
+        @staticmethod
+        def get_vault_tmp_dir():
+            tmp_dir = os.path.join(mock.vault_dir, 'tmp')
+            if not os.path.exists(tmp_dir):
+                os.makedirs(tmp_dir)
+            return tmp_dir
+
+        @staticmethod
+        def add_attachment(file_path, container_id, file_name=None, metadata=None):
+            with open(file_path, 'rb') as attachment_file:
+                vault_id = hashlib.sha1(attachment_file.read()).hexdigest()
+            with mock.lock:
+                mock.attachments.append((container_id, file_name, vault_id))
+            return {'succeeded': True, 'vault_id': vault_id}
+
+    vault_module = types.ModuleType('phantom.vault')
+    vault_module.Vault = Vault
+
+    def vault_info(vault_id=None, container_id=None, file_name=None):
+        with mock.lock:
+            mock.vault_info_calls += 1
+        vault_file = mock.vault.get(vault_id)
+        if not vault_file:
+            return False, 'vault id {0} not found'.format(vault_id), []
+        return True, 'success', [dict(vault_file)]
+
+    rules_module = types.ModuleType('phantom.rules')
+    rules_module.vault_info = vault_info
+
+    class BaseConnector(object):
+        APP_JSON = {}
+
+        def __init__(self):
+            self._action_results = []
+            self._action = None
+            self.saved_artifacts = []
+            self.saved_containers = []
+
+        def get_app_json(self):
+            return self.APP_JSON
+
+        def get_action_identifier(self):
+            return self._action
+
+        def get_container_id(self):
+            return 1
+
+        def _get_phantom_base_url(self):
+            return mock.base_url
+
+        def add_action_result(self, action_result):
+            self._action_results.append(action_result)
+            return action_result
+
+        def get_action_results(self):
+            return self._action_results
+
+        def debug_print(self, *args):
+            pass
+
+        def save_progress(self, *args):
+            pass
+
+        def load_state(self):
+            return {}
+
+        def save_state(self, state):
+            pass
+
+        def save_artifacts(self, artifacts):
+            self.saved_artifacts.extend(artifacts)
+            return APP_SUCCESS, 'success', list(range(len(artifacts)))
+
+        def save_artifact(self, artifact):
+            self.saved_artifacts.append(artifact)
+            return APP_SUCCESS, 'success', len(self.saved_artifacts)
+
+        def save_containers(self, containers):
+            self.saved_containers.extend(containers)
+            first_id = len(self.saved_containers) - len(containers) + 1000
+            return APP_SUCCESS, 'success', [{'success': True, 'id': first_id + index} for index in range(len(containers))]
+
+        def save_container(self, container):
+            self.saved_containers.append(container)
+            return APP_SUCCESS, 'success', len(self.saved_containers) + 999
+
+        def initialize(self):
+            return APP_SUCCESS
+
+        def finalize(self):
+            return APP_SUCCESS
+
+        def _handle_action(self, in_json, handle):
+            in_json = json.loads(in_json)
+            self._action = in_json['identifier']
+            if not(self.initialize()):
+                return json.dumps({'status': 'failed', 'message': 'initialize failed'})
+            for param in in_json.get('parameters', []):
+                self.handle_action(param)
+            self.finalize()
+            return json.dumps([
+                {'status': action_result.status, 'message': action_result.message, 'data': action_result.data, 'summary': action_result.summary}
+                for action_result in self._action_results
+            ])
+
+    base_connector_module = types.ModuleType('phantom.base_connector')
+    base_connector_module.BaseConnector = BaseConnector
+
+    phantom_package.app = app_module
+    phantom_package.action_result = action_result_module
+    phantom_package.vault = vault_module
+    phantom_package.rules = rules_module
+    phantom_package.base_connector = base_connector_module
+
+    return {
+        'phantom': phantom_package,
+        'phantom.app': app_module,
+        'phantom.action_result': action_result_module,
+        'phantom.vault': vault_module,
+        'phantom.rules': rules_module,
+        'phantom.base_connector': base_connector_module
+    }
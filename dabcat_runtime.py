@@ -0,0 +1,1419 @@
+import io
+import os
+import re
+import sys
+import json
+import time
+import fcntl
+import shutil
+import fnmatch
+import hashlib
+import marshal
+import mmap
+import tempfile
+import threading
+import collections
+
+import phantom.app as phantom
+from phantom.vault import Vault
+from phantom.action_result import ActionResult
+
+from dabcat_common import literal_pattern, index_params, fetch_container_artifacts
+
+# the DABCAT runtime is copied into every "dummy" app by dabcat2.py. generated connectors call check_if_data_match from
+# initialize/finalize and handle_action from handle_action; everything else is shared, module level state of the action process.
+# phantom starts a new process for every action, so anything expensive to import (requests, phantom.rules, tarfile, uuid,
+# multiprocessing.pool) is imported by the code path that needs it instead of up here. dabcat2.py --import-report shows the cost
+
+SETTINGS = {
+    'fail_on_data_not_found': None,
+    'cache_ttl': 300,
+    'retries': 3,
+    'connect_timeout': 5,
+    'read_timeout': 60,
+    'vault_cache_mb': 64,
+    'vault_cache_persist': False,
+    'stream_threshold_mb': 16,
+    'metrics': False,
+    'poll_workers': 4,
+    'poll_save_rate': 0,
+    'render_cache_mb': 256,
+    'param_workers': 0
+}
+
+RESERVED_KEYS = ('replacerizer', 'replacerizer_mode', 'dummy_file_vault_id', 'dummy_default', 'dummy_match')
+
+ARTIFACT_IDENTIFIERS = ('container_id', 'container', 'create_time', 'start_time', 'update_time', 'id', 'owner_id')
+
+CONTAINER_IDENTIFIERS = (
+    'create_time', 'asset_id', 'due_time', 'id', 'hash', 'start_time', 'artifact_update_time', 'container_update_time',
+    'owner_id', 'label', 'current_phase_id', 'close_time', 'open_time', 'closing_owner_id', 'role_id', 'node_guid', 'in_case',
+    'owner_name', 'tenant_id'
+)
+
+DYNAMIC_PATTERN = re.compile(r'\*\*\*([^\*]+)\*\*\*')
+WHITESPACE_PATTERN = re.compile(r'[ \t\n\r]*')
+
+STATE = {
+    'session': None,
+    'base_url': None,
+    'vault_cache': collections.OrderedDict(),
+    'vault_cache_size': 0,
+    'metrics': None,
+    'action_result': None,
+    'snapshot': None,
+    'vault_info': {}
+}
+
+METRICS_LOCK = threading.Lock()
+STATE_LOCK = threading.RLock()
+
+# a stale index is patched with what changed (see refresh_index), but every this many cache periods it is fetched in full
+FULL_REFRESH_TTLS = 12
+
+# ***param*** tokens are only replaced in a streamed action result when they fit in this many characters
+STREAM_TOKEN_LENGTH = 1024
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dabcat_snapshot')
+
+
+def configure(settings):
+    SETTINGS.update(settings)
+
+
+def setting(name, default, cast=int):
+    try:
+        return cast(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def flag(value):
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+# phase timings and counters are only collected while STATE['metrics'] holds a dict, otherwise every call is a single check
+def start_timer():
+    if STATE['metrics'] is None:
+        return None
+    return time.time()
+
+
+def stop_timer(phase, start_time):
+    if start_time is not None and STATE['metrics'] is not None:
+        with METRICS_LOCK:
+            STATE['metrics']['timings'][phase] += time.time() - start_time
+
+
+def count(counter, amount=1):
+    if STATE['metrics'] is not None:
+        with METRICS_LOCK:
+            STATE['metrics']['counters'][counter] += amount
+
+
+def reset_metrics():
+    if setting('DABCAT_METRICS', str(SETTINGS['metrics']), cast=flag):
+        STATE['metrics'] = {'timings': collections.defaultdict(float), 'counters': collections.defaultdict(int)}
+    else:
+        STATE['metrics'] = None
+
+
+def report_metrics(connector):
+    if STATE['metrics'] is None:
+        return
+    metrics = {
+        'timings_ms': dict((phase, round(seconds * 1000, 3)) for phase, seconds in STATE['metrics']['timings'].items()),
+        'counters': dict(STATE['metrics']['counters'])
+    }
+    connector.debug_print('DABCAT metrics', json.dumps(metrics, sort_keys=True))
+    if STATE['action_result'] is not None:
+        STATE['action_result'].update_summary({'dabcat_metrics': metrics})
+
+
+def add_action_result(connector, param):
+    STATE['action_result'] = connector.add_action_result(ActionResult(dict(param)))
+    return STATE['action_result']
+
+
+def early_failure(connector, param, message):
+    action_result = add_action_result(connector, param)
+    action_result.set_status(phantom.APP_ERROR, message)
+    return action_result.get_status()
+
+
+def get_session(connector):
+    with STATE_LOCK:
+        return create_session(connector)
+
+
+def create_session(connector):
+    if STATE['session'] is None:
+        import requests
+        retries = requests.adapters.Retry(
+            total=setting('DABCAT_RETRIES', SETTINGS['retries']),
+            backoff_factor=0.5,
+            status_forcelist=[500, 502, 503, 504]
+        )
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=10, max_retries=retries)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'ph-auth-token': os.environ['PHANTOM_API_KEY']})
+        session.verify = False
+        STATE['base_url'] = os.environ.get('PHANTOM_BASE_URL', connector._get_phantom_base_url())
+        STATE['session'] = session
+
+    return STATE['session']
+
+
+def get_data(connector, endpoint, params=None):
+    timeout = (
+        setting('DABCAT_CONNECT_TIMEOUT', SETTINGS['connect_timeout'], cast=float),
+        setting('DABCAT_READ_TIMEOUT', SETTINGS['read_timeout'], cast=float)
+    )
+    start_time = start_timer()
+    try:
+        session = get_session(connector)
+        r = session.get('{0}rest/{1}'.format(STATE['base_url'], endpoint), params=params, timeout=timeout)
+        r.raise_for_status()
+        count('rest_calls')
+        count('rest_bytes', len(r.content))
+        return True, r.json()
+    except Exception as e:
+        message = ('Action run failed. Exception: {0}').format(str(e))
+        return False, message
+    finally:
+        stop_timer('rest_{0}'.format(endpoint), start_time)
+
+
+# the demo_configuration index (containers plus their artifacts) is cached on disk under the vault tmp dir so that
+# every action process on the node shares it. writes are atomic renames and refreshes are serialized by a lock file
+def cache_path(product, action):
+    product_key = hashlib.sha1(product.encode('utf-8')).hexdigest()
+    return os.path.join(Vault.get_vault_tmp_dir(), 'dabcat_cache', product_key, '{0}.json'.format(action))
+
+
+def cache_ttl():
+    return setting('DABCAT_CACHE_TTL', SETTINGS['cache_ttl'])
+
+
+def read_cache(product, action, stale_ok=False):
+    index_path = cache_path(product, action)
+    try:
+        if not(stale_ok) and time.time() - os.path.getmtime(index_path) > cache_ttl():
+            return None
+        with open(index_path, 'r') as cache_file:
+            index = json.load(cache_file)
+        if not(stale_ok):
+            count('index_cache_hits')
+        return index
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def write_cache(product, action, index):
+    index_path = cache_path(product, action)
+    try:
+        cache_fd, cache_tmp_path = tempfile.mkstemp(dir=os.path.dirname(index_path))
+        with os.fdopen(cache_fd, 'w') as cache_file:
+            json.dump(index, cache_file)
+        os.rename(cache_tmp_path, index_path)
+    except (IOError, OSError):
+        pass
+
+
+def invalidate_cache(product):
+    shutil.rmtree(os.path.dirname(cache_path(product, '')), ignore_errors=True)
+
+
+def high_water_mark(containers, artifacts):
+    # the newest of container_update_time, artifact_update_time (the container's record of artifact changes) and artifact
+    # update_time seen, all from the server's clock, so it is safe to compare against on the next refresh
+    update_times = [datum.get('container_update_time') or '' for datum in containers]
+    update_times.extend(datum.get('artifact_update_time') or '' for datum in containers)
+    update_times.extend(artifact.get('update_time') or '' for artifact in artifacts)
+    return max(update_times or [''])
+
+
+def fetch_artifacts(connector, container_ids):
+    return fetch_container_artifacts(lambda params: get_data(connector, 'artifact', params=params), container_ids)
+
+
+def fetch_index(connector, product, action):
+    success, containers = get_data(connector, 'container', params=index_params(product, action, page_size=0))
+    if not(success):
+        return False, containers
+
+    success, artifacts = fetch_artifacts(connector, [datum['id'] for datum in containers['data']])
+    if not(success):
+        return False, artifacts
+
+    return True, {
+        'containers': containers,
+        'artifacts': artifacts,
+        'high_water_mark': high_water_mark(containers['data'], [artifact for container_artifacts in artifacts.values() for artifact in container_artifacts]),
+        'fetched_at': time.time()
+    }
+
+
+def refresh_index(connector, product, action, index):
+    # patches a stale index with only what changed since its high water mark: containers whose own fields changed and containers
+    # whose artifact_update_time phantom moved forward for an added or edited artifact. the affected containers get their
+    # artifacts fetched again, which also drops edited away or deleted artifacts. deleted containers (or ones moved out of
+    # demo_configuration) don't show up in any of those, so the total count is checked and anything off means a full fetch.
+    # artifact deletions phantom doesn't record anywhere are picked up by the full fetch every FULL_REFRESH_TTLS cache periods.
+    # returns None when the index can't be patched
+    if not(index.get('high_water_mark')) or time.time() - index.get('fetched_at', 0) > cache_ttl() * FULL_REFRESH_TTLS:
+        return None
+
+    since = '"{0}"'.format(index['high_water_mark'])
+    success, changed = get_data(connector, 'container', params=index_params(product, action, page_size=0, _filter_container_update_time__gte=since))
+    if not(success):
+        return None
+    success, artifact_changed = get_data(connector, 'container', params=index_params(product, action, page_size=0, _filter_artifact_update_time__gte=since))
+    if not(success):
+        return None
+    success, total = get_data(connector, 'container', params=index_params(product, action, page_size=1))
+    if not(success):
+        return None
+
+    containers = collections.OrderedDict((datum['id'], datum) for datum in index['containers']['data'])
+    for datum in changed['data'] + artifact_changed['data']:
+        containers[datum['id']] = datum
+    if len(containers) != total['count']:
+        count('index_refresh_fallbacks')
+        return None
+
+    changed_ids = set(datum['id'] for datum in changed['data'] + artifact_changed['data'])
+    success, artifacts = fetch_artifacts(connector, sorted(changed_ids))
+    if not(success):
+        return None
+
+    count('index_refreshes')
+    count('index_refresh_changes', len(changed_ids))
+    index['artifacts'].update(artifacts)
+    index['containers']['data'] = sorted(containers.values(), key=lambda datum: datum['id'])
+    index['containers']['count'] = len(containers)
+    index['high_water_mark'] = max(index['high_water_mark'], high_water_mark(
+        changed['data'] + artifact_changed['data'], [artifact for container_artifacts in artifacts.values() for artifact in container_artifacts]
+    ))
+    return index
+
+
+def get_index(connector, product, action):
+    if cache_ttl() <= 0:
+        return fetch_index(connector, product, action)
+
+    index = read_cache(product, action)
+    if index is not None:
+        return True, index
+
+    index_path = cache_path(product, action)
+    try:
+        if not os.path.exists(os.path.dirname(index_path)):
+            os.makedirs(os.path.dirname(index_path))
+    except OSError:
+        pass
+
+    with open('{0}.lock'.format(index_path), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            index = read_cache(product, action)
+            if index is not None:
+                return True, index
+            count('index_cache_misses')
+            index = read_cache(product, action, stale_ok=True)
+            if index is not None:
+                index = refresh_index(connector, product, action, index)
+            if index is not None:
+                success = True
+            else:
+                success, index = fetch_index(connector, product, action)
+            if success:
+                write_cache(product, action, index)
+            return success, index
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# a snapshot is the demo_configuration index and vault payloads exported by dabcat2.py --snapshot into the app itself.
+# payloads are packed into one file that is memory mapped, and looked up by vault id through the offsets in index.json
+class SnapshotPayload(io.RawIOBase):
+    def __init__(self, data, offset, length):
+        self.data = data
+        self.position = offset
+        self.end = offset + length
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.end - self.position)
+        buffer[:size] = self.data[self.position:self.position + size]
+        self.position += size
+        return size
+
+
+def get_snapshot():
+    if STATE['snapshot'] is None:
+        snapshot = {'product': None, 'actions': {}, 'payloads': {}, 'data': b''}
+        if setting('DABCAT_SNAPSHOT', 'true', cast=flag):
+            try:
+                with open(os.path.join(SNAPSHOT_DIR, 'index.json'), 'r') as index_file:
+                    snapshot.update(json.load(index_file))
+                with open(os.path.join(SNAPSHOT_DIR, 'payloads.bin'), 'rb') as payload_file:
+                    try:
+                        snapshot['data'] = mmap.mmap(payload_file.fileno(), 0, access=mmap.ACCESS_READ)
+                    except (ValueError, mmap.error):
+                        snapshot['data'] = payload_file.read()
+            except (IOError, OSError, ValueError):
+                pass
+        STATE['snapshot'] = snapshot
+
+    return STATE['snapshot']
+
+
+def get_snapshot_payload(vault_id):
+    payload = get_snapshot()['payloads'].get(vault_id.strip())
+    if payload is not None:
+        count('snapshot_payload_hits')
+        return tuple(payload)
+
+    return None
+
+
+def open_snapshot_payload(payload):
+    return io.BufferedReader(SnapshotPayload(get_snapshot()['data'], payload[0], payload[1]))
+
+
+def get_run_context(connector, use_snapshot=True):
+    app_json = connector.get_app_json()
+    product = app_json['product_name']
+    action = connector.get_action_identifier()
+
+    context_key = '_dabcat_run_context' if use_snapshot else '_dabcat_live_context'
+    run_context = getattr(connector, context_key, None)
+    if run_context is None or run_context['key'] != (product, action):
+        snapshot = get_snapshot() if use_snapshot else None
+        if snapshot and snapshot['product'] == product and action in snapshot['actions']:
+            count('snapshot_index_hits')
+            success, index, from_snapshot = True, snapshot['actions'][action], True
+        else:
+            if action == 'test_connectivity':
+                invalidate_cache(product)
+            success, index = get_index(connector, product, action)
+            from_snapshot = False
+        run_context = {'key': (product, action), 'appid': app_json['appid'], 'success': success, 'index': index, 'match_index': None, 'snapshot': from_snapshot}
+        if success:
+            setattr(connector, context_key, run_context)
+
+    return run_context
+
+
+# vault ids are content hashes, so whatever is read from the vault can be kept for the life of the process
+def vault_cache_get(key):
+    with STATE_LOCK:
+        vault_cache = STATE['vault_cache']
+        if key not in vault_cache:
+            count('vault_cache_misses')
+            return None
+        count('vault_cache_hits')
+        entry = vault_cache.pop(key)
+        vault_cache[key] = entry
+        return entry[1]
+
+
+def vault_cache_put(key, value, weight):
+    cache_limit = setting('DABCAT_VAULT_CACHE_MB', SETTINGS['vault_cache_mb'], cast=float) * 1024 * 1024
+    if weight > cache_limit:
+        return value
+
+    with STATE_LOCK:
+        vault_cache = STATE['vault_cache']
+        if key in vault_cache:
+            STATE['vault_cache_size'] -= vault_cache.pop(key)[0]
+        vault_cache[key] = (weight, value)
+        STATE['vault_cache_size'] += weight
+        while STATE['vault_cache_size'] > cache_limit:
+            STATE['vault_cache_size'] -= vault_cache.popitem(last=False)[1][0]
+
+    return value
+
+
+def get_vault_info(vault_id):
+    # the same vault id gets resolved for the stream check, the read, attachments and poll dedupe, so the answer is kept
+    # for the life of the process. ids are content hashes and a path never changes for one
+    vault_id = vault_id.strip()
+    if vault_id not in STATE['vault_info']:
+        count('vault_info_calls')
+        try:
+            import phantom.rules as ph_rules
+            success, message, vault_info = ph_rules.vault_info(vault_id=vault_id)
+            vault_info = list(vault_info or [])
+        except Exception as err:
+            success, message, vault_info = False, str(err), []
+        STATE['vault_info'][vault_id] = (success and bool(vault_info), message, vault_info[0] if vault_info else None)
+
+    return STATE['vault_info'][vault_id]
+
+
+def get_vault_path(vault_id):
+    success, message, vault_info = get_vault_info(vault_id)
+    if not(success):
+        return False, 'Could not retrieve data. Details - {0}'.format(message)
+
+    return True, vault_info['path']
+
+
+def decode_buffer(data, offset=0, length=None):
+    # on python 3 the text is decoded straight out of the mapped pages, so a payload is never held as bytes and text
+    end = len(data) if length is None else offset + length
+    if sys.version_info[0] < 3:
+        return data[offset:end]
+    with memoryview(data) as view:
+        return str(view[offset:end], 'utf-8')
+
+
+def read_vault_file(vault_id):
+    payload = get_snapshot_payload(vault_id)
+    if payload is not None:
+        count('vault_bytes_read', payload[1])
+        return True, decode_buffer(get_snapshot()['data'], payload[0], payload[1])
+
+    success, vault_path = get_vault_path(vault_id)
+    if not(success):
+        return False, vault_path
+
+    start_time = start_timer()
+    try:
+        with open(vault_path, 'rb') as vault_file:
+            if not(os.fstat(vault_file.fileno()).st_size):
+                return True, u''
+            vault_map = mmap.mmap(vault_file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                vault_data = decode_buffer(vault_map)
+                count('vault_bytes_read', len(vault_map))
+            finally:
+                vault_map.close()
+        return True, vault_data
+    except Exception as err:
+        return False, 'Could not retrieve data. Details - {0}'.format(str(err))
+    finally:
+        stop_timer('vault_read', start_time)
+
+
+def get_vault_data(vault_id):
+    vault_id = vault_id.strip()
+    vault_data = vault_cache_get(('text', vault_id))
+    if vault_data is not None:
+        return True, vault_data
+
+    success, vault_data = read_vault_file(vault_id)
+    if not(success):
+        return False, vault_data
+
+    return True, vault_cache_put(('text', vault_id), vault_data, len(vault_data))
+
+
+def get_vault_json(vault_id):
+    vault_id = vault_id.strip()
+    vault_json = vault_cache_get(('json', vault_id))
+    if vault_json is not None:
+        return True, vault_json
+
+    persist = setting('DABCAT_VAULT_CACHE_PERSIST', str(SETTINGS['vault_cache_persist']), cast=flag)
+    persist_path = os.path.join(Vault.get_vault_tmp_dir(), 'dabcat_cache', 'vault', '{0}.py{1}{2}.marshal'.format(vault_id, *sys.version_info[:2]))
+    if persist:
+        start_time = start_timer()
+        try:
+            with open(persist_path, 'rb') as persist_file:
+                vault_json = marshal.load(persist_file)
+            count('vault_bytes_read', os.path.getsize(persist_path))
+            return True, vault_cache_put(('json', vault_id), vault_json, os.path.getsize(persist_path))
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            pass
+        finally:
+            stop_timer('vault_read', start_time)
+
+    success, vault_data = read_vault_file(vault_id)
+    if not(success):
+        return False, vault_data
+
+    start_time = start_timer()
+    try:
+        vault_json = json.loads(vault_data)
+    except Exception as err:
+        return False, 'Unable to load data. Details - {0}'.format(str(err))
+    finally:
+        stop_timer('json_parse', start_time)
+
+    if persist:
+        try:
+            if not os.path.exists(os.path.dirname(persist_path)):
+                os.makedirs(os.path.dirname(persist_path))
+            persist_fd, persist_tmp_path = tempfile.mkstemp(dir=os.path.dirname(persist_path))
+            with os.fdopen(persist_fd, 'wb') as persist_file:
+                marshal.dump(vault_json, persist_file)
+            os.rename(persist_tmp_path, persist_path)
+        except (IOError, OSError, ValueError):
+            pass
+
+    return True, vault_cache_put(('json', vault_id), vault_json, len(vault_data))
+
+
+def get_stream_path(vault_id):
+    if vault_cache_get(('text', vault_id)) is not None or vault_cache_get(('json', vault_id)) is not None:
+        return True, None
+
+    payload = get_snapshot_payload(vault_id)
+    if payload is not None:
+        if payload[1] < setting('DABCAT_STREAM_THRESHOLD_MB', SETTINGS['stream_threshold_mb'], cast=float) * 1024 * 1024:
+            return True, None
+        return True, payload
+
+    success, vault_path = get_vault_path(vault_id)
+    if not(success):
+        return False, vault_path
+
+    if os.path.getsize(vault_path) < setting('DABCAT_STREAM_THRESHOLD_MB', SETTINGS['stream_threshold_mb'], cast=float) * 1024 * 1024:
+        return True, None
+
+    return True, vault_path
+
+
+def open_action_results(stream_source):
+    if isinstance(stream_source, tuple):
+        return io.TextIOWrapper(open_snapshot_payload(stream_source), encoding='utf-8')
+
+    return io.open(stream_source, 'r', encoding='utf-8')
+
+
+class ReplacerizedReader(object):
+    # runs a text mode replacerizer over the raw file text a chunk at a time, so a streamed action result is replacerized
+    # exactly like one read whole (escaped slashes, \u escapes and spacing included). text within the longest key (or
+    # STREAM_TOKEN_LENGTH for ***param*** tokens) of the end of a chunk is held back until the next one, so every match
+    # still sees everything after it that could make it longer
+    def __init__(self, source, replacerizer, param):
+        self.source = source
+        self.pattern = replacerizer.pattern
+        self.replacement = replacerizer.make_replacement(param)
+        self.tail = max(replacerizer.longest_key, STREAM_TOKEN_LENGTH)
+        self.pending = u''
+        self.eof = False
+
+    def read(self, size):
+        while not(self.eof):
+            chunk = self.source.read(max(size, self.tail))
+            self.eof = not(chunk)
+            self.pending += chunk
+            cut = len(self.pending) if self.eof else len(self.pending) - self.tail
+            if cut <= 0:
+                continue
+
+            pieces = []
+            position = 0
+            for match in self.pattern.finditer(self.pending):
+                if match.start() >= cut:
+                    break
+                pieces.append(self.pending[position:match.start()])
+                pieces.append(self.replacement(match))
+                position = match.end()
+            if position < cut:
+                pieces.append(self.pending[position:cut])
+                position = cut
+            self.pending = self.pending[position:]
+            replaced = u''.join(pieces)
+            if replaced:
+                return replaced
+
+        return u''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.source.close()
+
+
+def iter_action_results(stream_source, replacerizer=None, param=None):
+    # walks the top level list of action results with raw_decode so that each element of a 'data' list is decoded
+    # (and can be thrown away) on its own, instead of holding the whole parsed payload in memory
+    decoder = json.JSONDecoder()
+    vault_file = open_action_results(stream_source)
+    if replacerizer:
+        vault_file = ReplacerizedReader(vault_file, replacerizer, param)
+    with vault_file:
+        state = {'buffer': u'', 'position': 0, 'read_size': 65536, 'eof': False}
+
+        def fill():
+            chunk = vault_file.read(max(state['read_size'], len(state['buffer']) - state['position']))
+            state['buffer'] = state['buffer'][state['position']:] + chunk
+            state['position'] = 0
+            state['eof'] = not(chunk)
+            return not(state['eof'])
+
+        def peek():
+            while True:
+                state['position'] = WHITESPACE_PATTERN.match(state['buffer'], state['position']).end()
+                if state['position'] < len(state['buffer']):
+                    return state['buffer'][state['position']]
+                if not(fill()):
+                    raise ValueError('Unexpected end of action result data')
+
+        def take(expected):
+            char = peek()
+            if char not in expected:
+                raise ValueError('Expected one of "{0}" but found "{1}" in action result data'.format(expected, char))
+            state['position'] += 1
+            return char
+
+        def value():
+            peek()
+            while True:
+                try:
+                    decoded, end = decoder.raw_decode(state['buffer'], state['position'])
+                    if end < len(state['buffer']) or state['eof'] or not(fill()):
+                        state['position'] = end
+                        return decoded
+                except ValueError:
+                    if not(fill()):
+                        raise
+
+        take('[')
+        if peek() == ']':
+            return
+        result_index = 0
+        while True:
+            take('{')
+            while peek() != '}':
+                key = value()
+                take(':')
+                if key == 'data' and peek() == '[':
+                    take('[')
+                    while peek() != ']':
+                        yield result_index, key, value()
+                        if take(',]') == ']':
+                            state['position'] -= 1
+                    take(']')
+                else:
+                    yield result_index, key, value()
+                if take(',}') == '}':
+                    state['position'] -= 1
+            take('}')
+            if take(',]') == ']':
+                return
+            result_index += 1
+
+
+def stream_action_results(action_result, stream_source, param, replacerizer, structural):
+    summary = None
+    message = None
+    count('vault_bytes_read', stream_source[1] if isinstance(stream_source, tuple) else os.path.getsize(stream_source))
+    start_time = start_timer()
+    try:
+        # text mode replacerizers run over the raw text on the way in, structural ones over each decoded value
+        for result_index, key, value in iter_action_results(stream_source, None if structural else replacerizer, param):
+            if key not in ('data', 'summary', 'message') or (key != 'data' and result_index != 0):
+                continue
+            if replacerizer and structural:
+                value = replacerize(value, param, replacerizer, structural)
+            if key == 'data':
+                action_result.add_data(value)
+            elif key == 'summary':
+                summary = value
+            else:
+                message = value
+    except Exception as err:
+        return False, 'Unable to load data. Details - {0}'.format(str(err))
+    finally:
+        stop_timer('stream_decode', start_time)
+
+    action_result.update_summary(summary)
+    return True, message
+
+
+def compile_replacerizer(replacerizer_json):
+    replacements = dict((key, u'{0}'.format(value)) for key, value in replacerizer_json.items() if key)
+    dynamic_keys = set(key for key, value in replacements.items() if DYNAMIC_PATTERN.search(value))
+    alternatives = [DYNAMIC_PATTERN.pattern]
+    if replacements:
+        alternatives.insert(0, literal_pattern(replacements.keys()))
+    replacerizer_pattern = re.compile(u'|'.join(alternatives))
+
+    def make_replacement(param):
+        def dynamic_replacement(match):
+            if match.group(1) not in param:
+                return match.group()
+            return u'{0}'.format(param[match.group(1)])
+
+        def replacement(match):
+            if match.group(1) is not None:
+                return dynamic_replacement(match)
+            if match.group() in dynamic_keys:
+                return DYNAMIC_PATTERN.sub(dynamic_replacement, replacements[match.group()])
+            return replacements[match.group()]
+
+        return replacement
+
+    def apply_replacerizer(action_result_data, param):
+        return replacerizer_pattern.sub(make_replacement(param), action_result_data)
+
+    # what ReplacerizedReader needs to run the same replacement over a file a chunk at a time
+    apply_replacerizer.pattern = replacerizer_pattern
+    apply_replacerizer.make_replacement = make_replacement
+    apply_replacerizer.longest_key = max([len(key) for key in replacements] or [0])
+    return apply_replacerizer
+
+
+def get_replacerizer(vault_id):
+    vault_id = vault_id.strip()
+    replacerizer = vault_cache_get(('replacerizer', vault_id))
+    if replacerizer is not None:
+        return True, replacerizer
+
+    success, replacerizer_json = get_vault_json(vault_id)
+    if not(success):
+        return False, replacerizer_json
+
+    try:
+        replacerizer = compile_replacerizer(replacerizer_json)
+    except Exception as err:
+        return False, 'Unable to load replacerizer. Details - {0}'.format(str(err))
+
+    replacerizer_size = sum(len(key) + len(u'{0}'.format(value)) for key, value in replacerizer_json.items())
+    return True, vault_cache_put(('replacerizer', vault_id), replacerizer, replacerizer_size)
+
+
+class RecordingParam(dict):
+    # a param that remembers which keys the replacerizer looked at. those depend only on the action result and the
+    # replacerizer, never on the param values, so they are all a rendered result has to be keyed on
+    def __init__(self, param):
+        dict.__init__(self, param)
+        self.referenced = set()
+
+    def __contains__(self, key):
+        self.referenced.add(key)
+        return dict.__contains__(self, key)
+
+    def __getitem__(self, key):
+        self.referenced.add(key)
+        return dict.__getitem__(self, key)
+
+
+# rendered (replacerized and parsed) action results are kept in memory and in the vault tmp dir, keyed by the action result
+# and replacerizer vault ids plus the values of only the params they reference, so repeat runs skip the whole render
+def render_cache_limit():
+    return setting('DABCAT_RENDER_CACHE_MB', SETTINGS['render_cache_mb'], cast=float) * 1024 * 1024
+
+
+def render_cache_path(key, suffix):
+    return os.path.join(Vault.get_vault_tmp_dir(), 'dabcat_cache', 'render', '{0}{1}'.format(key, suffix))
+
+
+def render_base_key(render_base):
+    return hashlib.sha1(json.dumps(list(render_base)).encode('utf-8')).hexdigest()
+
+
+def render_key(render_base, referenced, param):
+    values = [[name, name in param, u'{0}'.format(param[name]) if name in param else None] for name in sorted(referenced)]
+    return hashlib.sha1(json.dumps([list(render_base), values]).encode('utf-8')).hexdigest()
+
+
+def get_render_refs(render_base):
+    base_key = render_base_key(render_base)
+    referenced = vault_cache_get(('render_refs', base_key))
+    if referenced is not None:
+        return referenced
+
+    try:
+        with open(render_cache_path(base_key, '.refs.json'), 'r') as refs_file:
+            referenced = json.load(refs_file)
+    except (IOError, OSError, ValueError):
+        return None
+    return vault_cache_put(('render_refs', base_key), referenced, len(referenced))
+
+
+def get_rendered(render_base, param):
+    if render_cache_limit() <= 0:
+        return None
+
+    referenced = get_render_refs(render_base)
+    if referenced is None:
+        count('render_cache_misses')
+        return None
+
+    key = render_key(render_base, referenced, param)
+    rendered = vault_cache_get(('render', key))
+    if rendered is not None:
+        count('render_cache_hits')
+        return rendered
+
+    render_path = render_cache_path(key, '.py{0}{1}.marshal'.format(*sys.version_info[:2]))
+    start_time = start_timer()
+    try:
+        with open(render_path, 'rb') as render_file:
+            rendered = marshal.load(render_file)
+        os.utime(render_path, None)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        count('render_cache_misses')
+        return None
+    finally:
+        stop_timer('render_cache_read', start_time)
+
+    count('render_cache_hits')
+    return vault_cache_put(('render', key), rendered, os.path.getsize(render_path))
+
+
+def write_render_file(render_path, data):
+    render_fd, render_tmp_path = tempfile.mkstemp(dir=os.path.dirname(render_path))
+    with os.fdopen(render_fd, 'wb') as render_file:
+        render_file.write(data)
+    os.rename(render_tmp_path, render_path)
+
+
+def evict_render_cache(limit):
+    # least recently used first, hits touch the mtime of the file they read
+    render_dir = os.path.dirname(render_cache_path('', ''))
+    entries = []
+    for file_name in os.listdir(render_dir):
+        if file_name.endswith('.marshal'):
+            file_stat = os.stat(os.path.join(render_dir, file_name))
+            entries.append((file_stat.st_mtime, file_stat.st_size, os.path.join(render_dir, file_name)))
+
+    total_size = sum(entry[1] for entry in entries)
+    for _, file_size, file_path in sorted(entries):
+        if total_size <= limit:
+            break
+        try:
+            os.remove(file_path)
+            total_size -= file_size
+        except OSError:
+            pass
+
+
+def put_rendered(render_base, referenced, param, rendered):
+    limit = render_cache_limit()
+    if limit <= 0:
+        return rendered
+
+    referenced = sorted(referenced)
+    key = render_key(render_base, referenced, param)
+    rendered_data = marshal.dumps(rendered)
+    vault_cache_put(('render_refs', render_base_key(render_base)), referenced, len(referenced))
+    vault_cache_put(('render', key), rendered, len(rendered_data))
+    if len(rendered_data) > limit:
+        return rendered
+
+    start_time = start_timer()
+    try:
+        if not os.path.exists(os.path.dirname(render_cache_path(key, ''))):
+            os.makedirs(os.path.dirname(render_cache_path(key, '')))
+        write_render_file(render_cache_path(render_base_key(render_base), '.refs.json'), json.dumps(referenced).encode('utf-8'))
+        write_render_file(render_cache_path(key, '.py{0}{1}.marshal'.format(*sys.version_info[:2])), rendered_data)
+        evict_render_cache(limit)
+    except (IOError, OSError, ValueError):
+        pass
+    finally:
+        stop_timer('render_cache_write', start_time)
+
+    return rendered
+
+
+def replacerize_structure(data, param, replacerizer):
+    if isinstance(data, dict):
+        return dict((replacerize_structure(key, param, replacerizer), replacerize_structure(value, param, replacerizer)) for key, value in data.items())
+    if isinstance(data, list):
+        return [replacerize_structure(value, param, replacerizer) for value in data]
+    if isinstance(data, type(u'')):
+        return replacerizer(data, param)
+
+    return data
+
+
+def replacerize(data, param, replacerizer, structural):
+    start_time = start_timer()
+    try:
+        if structural:
+            return replacerize_structure(data, param, replacerizer)
+        return json.loads(replacerizer(json.dumps(data, ensure_ascii=False), param))
+    finally:
+        stop_timer('replacerize', start_time)
+
+
+def normalize(value):
+    return u'{0}'.format(value).lower()
+
+
+def build_match_index(connector, index, action):
+    match_index = {'exact': {}, 'keysets': [], 'patterns': [], 'default': None, 'poll': []}
+    for order, datum in enumerate(index['containers']['data']):
+        criteria_artifacts = []
+        other_artifacts = []
+        for artifact in index['artifacts'].get(str(datum['id']), []):
+            artifact_name = artifact['name'].lower().replace(' ', '_')
+            if action == 'on_poll' and artifact_name == 'poll_artifact':
+                match_index['poll'].append(artifact)
+            elif artifact_name == 'matching_criteria':
+                criteria_artifacts.append(artifact)
+            else:
+                other_artifacts.append(artifact)
+
+        for artifact in criteria_artifacts:
+            entry = {'order': order, 'artifact': artifact, 'other_artifacts': other_artifacts}
+            criteria = dict((cef_key, cef_value) for cef_key, cef_value in artifact['cef'].items() if cef_key not in RESERVED_KEYS)
+            match_mode = artifact['cef'].get('dummy_match')
+            if artifact['cef'].get('dummy_default'):
+                match_index['default'] = entry
+            elif match_mode in ('wildcard', 'regex'):
+                try:
+                    patterns = [
+                        (cef_key, re.compile(fnmatch.translate(normalize(cef_value)) if match_mode == 'wildcard' else u'(?:{0})\\Z'.format(cef_value), re.IGNORECASE))
+                        for cef_key, cef_value in criteria.items()
+                    ]
+                except re.error as err:
+                    connector.debug_print('DABCAT skipping matching criteria {0}. Details - {1}'.format(artifact['id'], str(err)))
+                    continue
+                match_index['patterns'].append((patterns, entry))
+            else:
+                keyset = tuple(sorted(criteria.keys()))
+                if keyset not in match_index['exact']:
+                    match_index['exact'][keyset] = {}
+                    match_index['keysets'].append(keyset)
+                match_key = tuple(normalize(criteria[cef_key]) for cef_key in keyset)
+                match_index['exact'][keyset].setdefault(match_key, entry)
+
+    return match_index
+
+
+def match(match_index, param):
+    matched_entry = None
+    for keyset in match_index['keysets']:
+        entry = match_index['exact'][keyset].get(tuple(normalize(param.get(cef_key)) for cef_key in keyset))
+        if entry and (matched_entry is None or entry['order'] < matched_entry['order']):
+            matched_entry = entry
+
+    if matched_entry is None:
+        for patterns, entry in match_index['patterns']:
+            if all(pattern.match(normalize(param.get(cef_key))) for cef_key, pattern in patterns):
+                return entry
+
+    return matched_entry
+
+
+def strip_artifact_identifiers(artifact_data, appid):
+    for artifact_key in ARTIFACT_IDENTIFIERS:
+        artifact_data.pop(artifact_key, None)
+    artifact_data['ingest_app_id'] = appid
+    return artifact_data
+
+
+def add_other_artifacts(connector, param, appid, other_artifacts, replacerizer, structural):
+    if not(other_artifacts):
+        return True, None
+
+    if replacerizer:
+        other_artifacts = replacerize(other_artifacts, param, replacerizer, structural)
+    else:
+        other_artifacts = [dict(other_artifact) for other_artifact in other_artifacts]
+
+    container_id = connector.get_container_id()
+    attached_vault_ids = set()
+    for other_artifact in other_artifacts:
+        vault_id = (other_artifact.get('cef') or {}).get('vaultId', '').strip()
+        if vault_id and vault_id not in attached_vault_ids:
+            attached_vault_ids.add(vault_id)
+            success, message, vault_info = get_vault_info(vault_id)
+            if not(success):
+                return False, 'Could not load artifact file {0}. Details - {1}'.format(vault_id, message)
+            Vault.add_attachment(vault_info['path'], container_id, file_name=vault_info['name'])
+        other_artifact = strip_artifact_identifiers(other_artifact, appid)
+        other_artifact['container_id'] = container_id
+
+    start_time = start_timer()
+    if hasattr(connector, 'save_artifacts'):
+        status, message, _ = connector.save_artifacts(other_artifacts)
+    else:
+        for other_artifact in other_artifacts:
+            status, message, _ = connector.save_artifact(other_artifact)
+            if status == phantom.APP_ERROR:
+                break
+    stop_timer('artifact_save', start_time)
+    count('artifacts_saved', len(other_artifacts))
+    if status == phantom.APP_ERROR:
+        return False, 'Could not load artifact. Details - {0}'.format(message)
+
+    return True, None
+
+
+def get_poll_vault_data(poll_vault_id, label, appid, staging_dir):
+    import uuid
+    import tarfile
+    poll_vault_container_data = None
+    poll_vault_container_files = []
+    try:
+        payload = get_snapshot_payload(poll_vault_id)
+        if payload is not None:
+            container_tar = tarfile.open(fileobj=open_snapshot_payload(payload), mode='r|gz')
+        else:
+            success, poll_vault_path = get_vault_path(poll_vault_id)
+            if not(success):
+                return False, poll_vault_path
+            container_tar = tarfile.open(poll_vault_path, 'r|gz')
+        with container_tar:
+            for member in container_tar:
+                if not(member.isfile()):
+                    continue
+                member_name = os.path.basename(member.name)
+                if member_name.lower() == 'container.json':
+                    poll_vault_container_data = json.loads(container_tar.extractfile(member).read().decode('utf-8'))
+                    continue
+                # files already in the vault are attached from where they are, everything else is staged once
+                success, existing_path = get_vault_path(member_name)
+                if success:
+                    poll_vault_container_files.append((member_name, existing_path))
+                    continue
+                staged_path = os.path.join(staging_dir, member_name)
+                if not os.path.exists(staged_path):
+                    # other poll artifacts may be staging the same file at the same time, so it only shows up once complete
+                    staged_fd, staged_tmp_path = tempfile.mkstemp(dir=staging_dir)
+                    with os.fdopen(staged_fd, 'wb') as staged_file:
+                        shutil.copyfileobj(container_tar.extractfile(member), staged_file)
+                    os.rename(staged_tmp_path, staged_path)
+                poll_vault_container_files.append((member_name, staged_path))
+    except Exception as err:
+        return False, 'Unable to read poll data. Details - {0}'.format(str(err))
+
+    if poll_vault_container_data is None:
+        return False, 'Unable to read poll data. Details - no container.json in {0}'.format(poll_vault_id)
+
+    for artifact in poll_vault_container_data['artifacts']:
+        strip_artifact_identifiers(artifact, appid)
+    for container_key in CONTAINER_IDENTIFIERS:
+        poll_vault_container_data['container'].pop(container_key, None)
+    poll_vault_container_data['container']['source_data_identifier'] = str(uuid.uuid4())
+
+    container_details = poll_vault_container_data.pop('container', None)
+    container_details['artifacts'] = poll_vault_container_data.pop('artifacts', None)
+    container_details['label'] = label
+
+    file_names = dict(
+        (vault_doc['hash'], vault_doc['names'][0] if vault_doc.get('names') else None)
+        for vault_doc in poll_vault_container_data.pop('vault_documents', None) or []
+    )
+    attachments = [(file_path, file_names.get(file_hash)) for file_hash, file_path in poll_vault_container_files]
+
+    return True, (container_details, attachments)
+
+
+def save_poll_containers(connector, poll_containers):
+    # returns (container_id, message) for every poll container, container_id is None when it wasn't saved and message is set
+    # when something went wrong, so one bad container (or attachment) doesn't take the rest of the batch down with it
+    container_details = [poll_container[0] for poll_container in poll_containers]
+    if hasattr(connector, 'save_containers'):
+        status, message, container_responses = connector.save_containers(container_details)
+        if status == phantom.APP_ERROR:
+            return [(None, 'Unable to save poll data. Details - {0}'.format(message))] * len(poll_containers)
+        saved_containers = [
+            (container_response.get('id'), None) if container_response.get('success') and container_response.get('id') else
+            (None, 'Unable to save poll data. Details - {0}'.format(container_response.get('message', 'no container id returned')))
+            for container_response in container_responses
+        ]
+        saved_containers.extend([(None, 'Unable to save poll data. Details - no response for the container')] * (len(poll_containers) - len(saved_containers)))
+    else:
+        saved_containers = []
+        for container in container_details:
+            status, message, container_id = connector.save_container(container)
+            if status == phantom.APP_ERROR or not(container_id):
+                saved_containers.append((None, 'Unable to save poll data. Details - {0}'.format(message)))
+            else:
+                saved_containers.append((container_id, None))
+
+    results = []
+    for (container_id, message), (_, attachments) in zip(saved_containers, poll_containers):
+        if container_id is not None:
+            try:
+                for file_path, file_name in attachments:
+                    Vault.add_attachment(file_path, container_id, file_name=file_name)
+            except Exception as err:
+                message = 'Unable to write poll data. Details - {0}'.format(str(err))
+        results.append((container_id, message))
+
+    return results
+
+
+def iter_poll_containers(poll_artifacts, appid, staging_dir):
+    # tarballs are decoded and staged by a bounded thread pool (gzip and file copies release the GIL), but results are
+    # still handed back in poll artifact order so containers are saved in the order they were configured
+    def extract(poll_artifact):
+        poll_vault_id = poll_artifact['cef'].get('vaultId', '')
+        try:
+            return poll_vault_id, get_poll_vault_data(poll_vault_id, poll_artifact['cef'].get('label'), appid, staging_dir)
+        except Exception as err:
+            return poll_vault_id, (False, 'Unable to read poll data. Details - {0}'.format(str(err)))
+
+    poll_workers = min(setting('DABCAT_POLL_WORKERS', SETTINGS['poll_workers']), len(poll_artifacts))
+    if poll_workers <= 1:
+        for poll_artifact in poll_artifacts:
+            yield extract(poll_artifact)
+        return
+
+    import multiprocessing.pool
+    pool = multiprocessing.pool.ThreadPool(poll_workers)
+    try:
+        for poll_result in pool.imap(extract, poll_artifacts):
+            yield poll_result
+    finally:
+        pool.terminate()
+
+
+def handle_poll(connector, param, run_context, poll_artifacts):
+    action_result = add_action_result(connector, param)
+    staging_dir = tempfile.mkdtemp(dir=Vault.get_vault_tmp_dir())
+    save_rate = setting('DABCAT_POLL_SAVE_RATE', SETTINGS['poll_save_rate'], cast=float)
+    save_batch = max(1, setting('DABCAT_POLL_WORKERS', SETTINGS['poll_workers']))
+    failures = []
+    saved = [0]
+    try:
+        def save(pending):
+            start_time = start_timer()
+            saved_containers = save_poll_containers(connector, [poll_container for _, poll_container in pending])
+            stop_timer('poll_save', start_time)
+            for (poll_vault_id, _), (container_id, message) in zip(pending, saved_containers):
+                if container_id is not None:
+                    saved[0] += 1
+                if message:
+                    failures.append((poll_vault_id, message))
+            if save_rate > 0:
+                time.sleep(max(0, len(pending) / save_rate - (time.time() - save_started)))
+
+        pending = []
+        save_started = time.time()
+        start_time = start_timer()
+        for poll_vault_id, (success, poll_container) in iter_poll_containers(poll_artifacts, run_context['appid'], staging_dir):
+            if not(success):
+                failures.append((poll_vault_id, poll_container))
+                continue
+            pending.append((poll_vault_id, poll_container))
+            if len(pending) >= save_batch:
+                save(pending)
+                pending = []
+                save_started = time.time()
+        if pending:
+            save(pending)
+        stop_timer('poll', start_time)
+        count('poll_containers', saved[0])
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    for poll_vault_id, message in failures:
+        action_result.add_data({'vaultId': poll_vault_id, 'message': message})
+    action_result.update_summary({'containers_saved': saved[0], 'poll_artifacts_failed': len(failures)})
+    if failures and not(saved[0]):
+        return action_result.set_status(phantom.APP_ERROR, 'Poll failed. Details - {0}'.format(failures[0][1]))
+    if failures:
+        return action_result.set_status(phantom.APP_SUCCESS, 'Poll partially successful, {0} of {1} poll artifacts failed'.format(len(failures), len(poll_artifacts)))
+
+    return action_result.set_status(phantom.APP_SUCCESS, 'Poll successful')
+
+
+def render_data(data_entry, param):
+    # everything up to adding the action result: finding out if the result streams, loading the replacerizer and rendering.
+    # it touches no connector state, so the parameters of an action run can be rendered on a thread pool (see prerender)
+    data_artifact = data_entry['artifact']
+    data_vault_id = data_artifact['cef'].get('dummy_file_vault_id', '').strip()
+    structural = data_artifact['cef'].get('replacerizer_mode', '').lower() == 'structural'
+    replacerizer_id = data_artifact['cef'].get('replacerizer', '').strip()
+
+    success, stream_path = get_stream_path(data_vault_id)
+    if not(success):
+        return False, stream_path
+
+    # a rendered hit means the replacerizer itself is only needed for other artifacts
+    render_base = (data_vault_id, replacerizer_id, structural)
+    action_result_data = get_rendered(render_base, param) if replacerizer_id and not(stream_path) else None
+
+    replacerizer = None
+    if replacerizer_id and (action_result_data is None or data_entry['other_artifacts']):
+        success, replacerizer = get_replacerizer(replacerizer_id)
+        if not(success):
+            return False, replacerizer
+
+    if stream_path or action_result_data is not None:
+        return True, (stream_path, replacerizer, structural, action_result_data)
+
+    if replacerizer and not(structural):
+        success, action_result_data = get_vault_data(data_vault_id)
+        if not(success):
+            return False, action_result_data
+        start_time = start_timer()
+        try:
+            recording_param = RecordingParam(param)
+            action_result_data = replacerizer(action_result_data, recording_param)
+            stop_timer('replacerize', start_time)
+            start_time = start_timer()
+            action_result_data = json.loads(action_result_data)
+            stop_timer('json_parse', start_time)
+        except Exception as err:
+            return False, 'Unable to load data. Details - {0}'.format(str(err))
+        action_result_data = put_rendered(render_base, recording_param.referenced, param, action_result_data)
+    else:
+        success, action_result_data = get_vault_json(data_vault_id)
+        if not(success):
+            return False, action_result_data
+        if replacerizer:
+            recording_param = RecordingParam(param)
+            action_result_data = replacerize(action_result_data, recording_param, replacerizer, True)
+            action_result_data = put_rendered(render_base, recording_param.referenced, param, action_result_data)
+
+    return True, (stream_path, replacerizer, structural, action_result_data)
+
+
+def handle_data(connector, param, run_context, data_entry, rendered=None):
+    success, rendered = rendered or render_data(data_entry, param)
+    if not(success):
+        return early_failure(connector, param, rendered)
+    stream_path, replacerizer, structural, action_result_data = rendered
+
+    if stream_path:
+        action_result = add_action_result(connector, param)
+        success, message = stream_action_results(action_result, stream_path, param, replacerizer, structural)
+        if not(success):
+            return action_result.set_status(phantom.APP_ERROR, message)
+    else:
+        action_result = add_action_result(connector, param)
+        start_time = start_timer()
+        action_result.update_summary(action_result_data[0]['summary'])
+        for data_result in action_result_data:
+            if type(data_result['data']) == list:
+                for data_element in data_result['data']:
+                    action_result.add_data(data_element)
+            else:
+                action_result.add_data(data_result['data'])
+        stop_timer('add_data', start_time)
+        message = action_result_data[0]['message']
+
+    success, artifact_message = add_other_artifacts(connector, param, run_context['appid'], data_entry['other_artifacts'], replacerizer, structural)
+    if not(success):
+        return action_result.set_status(phantom.APP_ERROR, artifact_message)
+
+    return action_result.set_status(phantom.APP_SUCCESS, '{0}'.format(message))
+
+
+def same_param(param, other_param):
+    # phantom may add its own keys (like context) between parsing the action json and calling handle_action
+    return dict((key, value) for key, value in param.items() if key != 'context') == dict((key, value) for key, value in other_param.items() if key != 'context')
+
+
+def capture_params(connector, in_json, settings):
+    # called from the generated _handle_action with every param of the action run, before phantom calls handle_action
+    configure(settings)
+    connector._dabcat_params = None
+    if setting('DABCAT_PARAM_WORKERS', SETTINGS['param_workers']) <= 1:
+        return
+    try:
+        params = (json.loads(in_json) if isinstance(in_json, (type(u''), str)) else in_json).get('parameters') or []
+    except (ValueError, AttributeError):
+        return
+    if len(params) > 1:
+        connector._dabcat_params = [dict(param) for param in params]
+
+
+def prerender(connector, run_context, param):
+    try:
+        entry = find_entry(connector, param, run_context)
+        if entry is None:
+            # snapshot misses fall back to REST, which handle_action does on its own
+            return None
+        return render_data(entry, param)
+    except Exception:
+        # anything odd is rendered again by handle_action, which reports the error for this param
+        return None
+
+
+def take_prerendered(connector, param):
+    # renders the captured params on a thread pool on the first call, after that hands back one result per call in
+    # param order. anything out of step turns it off for the rest of the action run
+    params = getattr(connector, '_dabcat_params', None)
+    if not(params):
+        return None
+
+    prerendered = getattr(connector, '_dabcat_prerendered', None)
+    if prerendered is None:
+        run_context = get_run_context(connector)
+        if not(run_context['success']) or run_context['index']['containers']['count'] == 0 or run_context['key'][1] == 'on_poll':
+            connector._dabcat_params = None
+            return None
+        find_entry(connector, params[0], run_context)
+
+        import multiprocessing.pool
+        pool = multiprocessing.pool.ThreadPool(min(setting('DABCAT_PARAM_WORKERS', SETTINGS['param_workers']), len(params)))
+        prerendered = {'pool': pool, 'index': 0, 'results': pool.imap(lambda param: prerender(connector, run_context, param), params)}
+        connector._dabcat_prerendered = prerendered
+        count('prerendered_params', len(params))
+
+    rendered = next(prerendered['results']) if prerendered['index'] < len(params) else None
+    prerendered['index'] += 1
+    if prerendered['index'] > len(params) or not(same_param(params[prerendered['index'] - 1], param)):
+        rendered = None
+        prerendered['index'] = len(params)
+    if prerendered['index'] >= len(params):
+        prerendered['pool'].terminate()
+        connector._dabcat_params = None
+        connector._dabcat_prerendered = None
+
+    return rendered
+
+
+def check_if_data_match(connector, settings):
+    configure(settings)
+    if STATE['metrics'] is None:
+        reset_metrics()
+    run_context = get_run_context(connector)
+    return (run_context['success'] and run_context['index']['containers']['count'] > 0) or (SETTINGS['fail_on_data_not_found'] == True)
+
+
+def handle_action(connector, param, settings):
+    # returns None when DABCAT has nothing to say about this parameter so that the real connector code runs instead
+    configure(settings)
+    if STATE['metrics'] is None:
+        reset_metrics()
+    STATE['action_result'] = None
+    try:
+        return resolve_action(connector, param, take_prerendered(connector, param))
+    finally:
+        report_metrics(connector)
+        reset_metrics()
+
+
+def find_entry(connector, param, run_context):
+    if not(run_context['success']) or run_context['index']['containers']['count'] == 0:
+        return None
+
+    if run_context['match_index'] is None:
+        run_context['match_index'] = build_match_index(connector, run_context['index'], run_context['key'][1])
+    match_index = run_context['match_index']
+
+    if run_context['key'][1] == 'on_poll':
+        return match_index['poll'] or None
+
+    return match(match_index, param) or match_index['default']
+
+
+def resolve_action(connector, param, rendered=None):
+    run_context = get_run_context(connector)
+    entry = find_entry(connector, param, run_context)
+    if entry is None and run_context['snapshot']:
+        # a snapshot only holds what was in demo_configuration when the app was built, anything newer is only found over REST
+        run_context = get_run_context(connector, use_snapshot=False)
+        entry = find_entry(connector, param, run_context)
+
+    action = run_context['key'][1]
+    if entry is None:
+        if SETTINGS['fail_on_data_not_found'] == True:
+            return early_failure(connector, param, 'Theres is no data for polling action' if action == 'on_poll' else 'There is no data for the action/parameter selected')
+        return None
+
+    if action == 'on_poll':
+        return handle_poll(connector, param, run_context, entry)
+
+    return handle_data(connector, param, run_context, entry, rendered)